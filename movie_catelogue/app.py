@@ -1,13 +1,29 @@
-from flask import Flask, request, jsonify, render_template, redirect, send_file
+from flask import Flask, request, jsonify, render_template, redirect, Response, g, has_app_context, send_file
 import sqlite3
-import requests
+import click
 from contextlib import closing
 import csv
-from io import StringIO, BytesIO
+import io
+from io import StringIO
 import os
+import json
+import base64
+import functools
+import threading
+import time
 
 # Import configuration
 import config
+import db
+import collection_service
+import tmdb_cache
+import tmdb_client
+import identify_queue
+import poster_cache
+import response_cache
+import reidentify
+import metrics
+import title_index
 
 # === FLASK APP SETUP ===
 app = Flask(__name__)
@@ -19,21 +35,95 @@ DB_PATH = config.DB_PATH
 PAGE_SIZE = config.PAGE_SIZE
 # maximum allowed page size to prevent abuse
 MAX_PAGE_SIZE = getattr(config, 'MAX_PAGE_SIZE', 200)
+# cap on rowids accepted by batch lookups
+MAX_BATCH_ROWIDS = getattr(config, 'MAX_BATCH_ROWIDS', 5000)
 DEFAULT_STATUS = config.DEFAULT_STATUS
 DEFAULT_FORMAT = config.DEFAULT_FORMAT
 CSV_EXPORT_FILENAME = config.CSV_EXPORT_FILENAME
+# rows fetched and written per chunk of a streamed CSV export
+EXPORT_BATCH_SIZE = getattr(config, 'EXPORT_BATCH_SIZE', 500)
+# CSV import: rows per executemany batch, default duplicate handling, reasons listed in the report
+IMPORT_BATCH_SIZE = getattr(config, 'IMPORT_BATCH_SIZE', 500)
+IMPORT_DUPLICATE_MODE = getattr(config, 'IMPORT_DUPLICATE_MODE', 'skip')
+IMPORT_REPORT_LIMIT = getattr(config, 'IMPORT_REPORT_LIMIT', 200)
 TMDB_POSTER_SIZE = config.TMDB_POSTER_SIZE
 DEBUG = config.DEBUG
 AUTO_ADD_COLLECTIONS = config.AUTO_ADD_COLLECTIONS
+# requests slower than this are printed with the SQL time and work they caused (0 = off)
+SLOW_REQUEST_MS = getattr(config, 'SLOW_REQUEST_MS', 0)
+# use the SQLite FTS5 index for /api/search when the sqlite build supports it
+SEARCH_USE_FTS = getattr(config, 'SEARCH_USE_FTS', True)
+# identify added/imported movies on a background worker instead of inside the request
+BACKGROUND_IDENTIFY = getattr(config, 'BACKGROUND_IDENTIFY', True)
 
-if TMDB_API_KEY == "YOUR_TMDB_API_KEY_HERE":
+def tmdb_key_set():
+    return bool(TMDB_API_KEY and TMDB_API_KEY != "YOUR_TMDB_API_KEY_HERE")
+
+if not tmdb_key_set():
     print("Warning: TMDb API key is not set. Identification of movies will not work.")
  
 # === DATABASE HELPER ===
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # inside a request every call shares one pooled connection, released at teardown
+    if has_app_context():
+        conn = g.get("_db")
+        if conn is None:
+            conn = g._db = db.acquire()
+            conn.request_scoped = True
+        return conn
+    return db.acquire()
+
+@app.teardown_appcontext
+def release_db(exc):
+    conn = g.pop("_db", None)
+    if conn is not None:
+        conn.request_scoped = False
+        conn.close()
+
+# === INSTRUMENTATION ===
+@app.before_request
+def start_request_metrics():
+    g._started = time.perf_counter()
+    metrics.begin_request()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop("_started", None)
+    if started is None:
+        return response
+    # streamed bodies (CSV export) are still being generated at this point
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or "unmatched"
+    metrics.observe("http_request_duration_seconds", elapsed, endpoint=endpoint, method=request.method)
+    metrics.inc("http_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        sql = metrics.request_sql()
+        print("Slow request:", json.dumps({
+            "method": request.method, "path": request.full_path.rstrip("?"), "status": response.status_code,
+            "ms": round(elapsed * 1000, 1), "sql_ms": round(sql["seconds"] * 1000, 1),
+            "sql_statements": sql["statements"], "sql_vm_steps": sql["vm_steps"],
+        }))
+    return response
+
+@app.teardown_request
+def count_request_exception(exc):
+    if exc is not None:
+        metrics.inc("http_request_exceptions_total", endpoint=request.endpoint or "unmatched")
+
+# leading four digits of a year value ("1999", "1999-05-21"), otherwise 0
+YEAR_INT_SQL = ("(CASE WHEN trim({col}) GLOB '[0-9][0-9][0-9][0-9]*' "
+                "THEN CAST(substr(trim({col}), 1, 4) AS INTEGER) ELSE 0 END)")
+
+MOVIE_COLLECTIONS_COLUMNS = """
+    movie_rowid INTEGER NOT NULL REFERENCES movies(rowid) ON DELETE CASCADE,
+    collection_id INTEGER NOT NULL REFERENCES collections(id) ON DELETE CASCADE,
+    PRIMARY KEY(movie_rowid, collection_id)
+"""
+
+def normalize_barcode(code):
+    # scanners and hand entry differ in spacing and dashes; store and match the bare code
+    code = "".join(ch for ch in str(code or "") if not ch.isspace() and ch != "-")
+    return code or None
 
 def init_db():
     with closing(get_db()) as conn:
@@ -53,18 +143,51 @@ def init_db():
                 language TEXT,
                 region TEXT,
                 disc_count INTEGER,
-                notes TEXT
+                notes TEXT,
+                year_int INTEGER NOT NULL DEFAULT 0
             )
         """)
         c.execute("CREATE INDEX IF NOT EXISTS idx_title ON movies(title COLLATE NOCASE)")
         c.execute("CREATE INDEX IF NOT EXISTS idx_year ON movies(year)")
         c.execute("CREATE INDEX IF NOT EXISTS idx_status ON movies(status)")
         conn.commit()
-        # ensure tmdb_id column exists for older DBs
+        # ensure newer columns exist for older DBs
         cols = [r[1] for r in conn.execute("PRAGMA table_info(movies)").fetchall()]
-        if 'tmdb_id' not in cols:
-            c.execute("ALTER TABLE movies ADD COLUMN tmdb_id INTEGER")
-            conn.commit()
+        for name, col_type in (('poster_path', 'TEXT'), ('tmdb_id', 'INTEGER'), ('status', f"TEXT DEFAULT '{DEFAULT_STATUS}'"),
+                               ('version', 'TEXT'), ('country', 'TEXT'), ('language', 'TEXT'),
+                               ('region', 'TEXT'), ('disc_count', 'INTEGER'), ('notes', 'TEXT'),
+                               ('year_int', 'INTEGER NOT NULL DEFAULT 0')):
+            if name not in cols:
+                c.execute(f"ALTER TABLE movies ADD COLUMN {name} {col_type}")
+        # year_int mirrors the free-form year text as a sortable integer (0 = unknown)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS movies_year_ai AFTER INSERT ON movies BEGIN
+                UPDATE movies SET year_int = {YEAR_INT_SQL.format(col='new.year')} WHERE rowid = new.rowid;
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS movies_year_au AFTER UPDATE OF year ON movies BEGIN
+                UPDATE movies SET year_int = {YEAR_INT_SQL.format(col='new.year')} WHERE rowid = new.rowid;
+            END
+        """)
+        if 'year_int' not in cols:
+            # backfill rows written before the column existed
+            c.execute(f"UPDATE movies SET year_int = {YEAR_INT_SQL.format(col='year')}")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_year_int ON movies(year_int, title COLLATE NOCASE)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tmdb_id ON movies(tmdb_id)")
+        # not UNIQUE: a second copy can be added on purpose and duplicate-mode imports are allowed,
+        # so scans resolve duplicates through find_by_barcode instead
+        c.execute("CREATE INDEX IF NOT EXISTS idx_barcode ON movies(barcode) WHERE barcode IS NOT NULL")
+        # barcodes stored before they were normalized (imports kept "1-2" or spaces); only those rows are
+        # read back from the index, so once they are fixed this finds nothing
+        stale = c.execute(
+            "SELECT rowid, barcode FROM movies WHERE barcode IS NOT NULL AND (barcode GLOB '*[- ]*' OR barcode = '' "
+            "OR barcode GLOB ('*[' || char(9, 10, 11, 12, 13) || ']*'))"
+        ).fetchall()
+        if stale:
+            c.executemany("UPDATE movies SET barcode = ? WHERE rowid = ?",
+                          [(normalize_barcode(r[1]), r[0]) for r in stale])
+        conn.commit()
         # Collections support
         c.execute("""
             CREATE TABLE IF NOT EXISTS collections (
@@ -72,17 +195,130 @@ def init_db():
                 name TEXT UNIQUE NOT NULL
             )
         """)
+        c.execute(f"CREATE TABLE IF NOT EXISTS movie_collections ({MOVIE_COLLECTIONS_COLUMNS})")
+        conn.commit()
+        # older DBs created movie_collections without foreign keys: rebuild it with cascades
+        if not c.execute("PRAGMA foreign_key_list(movie_collections)").fetchall():
+            c.execute("PRAGMA foreign_keys=OFF")
+            try:
+                c.execute(f"CREATE TABLE movie_collections_new ({MOVIE_COLLECTIONS_COLUMNS})")
+                # orphaned associations are dropped on the way over
+                c.execute("""
+                    INSERT OR IGNORE INTO movie_collections_new (movie_rowid, collection_id)
+                    SELECT mc.movie_rowid, mc.collection_id FROM movie_collections mc
+                    JOIN movies m ON m.rowid = mc.movie_rowid
+                    JOIN collections col ON col.id = mc.collection_id
+                """)
+                c.execute("DROP TABLE movie_collections")
+                c.execute("ALTER TABLE movie_collections_new RENAME TO movie_collections")
+                conn.commit()
+            finally:
+                c.execute("PRAGMA foreign_keys=ON")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_collection_name ON collections(name COLLATE NOCASE)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_movie_collections_collection ON movie_collections(collection_id, movie_rowid)")
+        # movie_count is kept exact by triggers so /api/collections never counts on read
+        coll_cols = [r[1] for r in c.execute("PRAGMA table_info(collections)").fetchall()]
+        if 'movie_count' not in coll_cols:
+            c.execute("ALTER TABLE collections ADD COLUMN movie_count INTEGER NOT NULL DEFAULT 0")
+            c.execute("""
+                UPDATE collections SET movie_count =
+                    (SELECT COUNT(*) FROM movie_collections mc WHERE mc.collection_id = collections.id)
+            """)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS movie_collections_count_ai AFTER INSERT ON movie_collections BEGIN
+                UPDATE collections SET movie_count = movie_count + 1 WHERE id = new.collection_id;
+            END
+        """)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS movie_collections_count_ad AFTER DELETE ON movie_collections BEGIN
+                UPDATE collections SET movie_count = movie_count - 1 WHERE id = old.collection_id;
+            END
+        """)
         c.execute("""
-            CREATE TABLE IF NOT EXISTS movie_collections (
-                movie_rowid INTEGER NOT NULL,
-                collection_id INTEGER NOT NULL,
-                PRIMARY KEY(movie_rowid, collection_id)
+            CREATE TRIGGER IF NOT EXISTS movie_collections_count_au AFTER UPDATE OF collection_id ON movie_collections BEGIN
+                UPDATE collections SET movie_count = movie_count - 1 WHERE id = old.collection_id;
+                UPDATE collections SET movie_count = movie_count + 1 WHERE id = new.collection_id;
+            END
+        """)
+        # change counters for conditional GETs; seeded from the clock so a replaced DB never reuses a tag
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS data_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
             )
         """)
-        c.execute("CREATE INDEX IF NOT EXISTS idx_collection_name ON collections(name COLLATE NOCASE)")
+        for name in ("collections", "catalogue"):
+            c.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES (?, CAST(strftime('%s', 'now') AS INTEGER) * 1000)", (name,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS collections_version_{event.lower()} AFTER {event} ON collections BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE name = 'collections';
+                END
+            """)
+            # 'catalogue' covers everything a search result can show, including embedded collection names
+            for table in ("movies", "movie_collections", "collections"):
+                c.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS catalogue_version_{table}_{event.lower()} AFTER {event} ON {table} BEGIN
+                        UPDATE data_versions SET version = version + 1 WHERE name = 'catalogue';
+                    END
+                """)
         conn.commit()
 
+# columns mirrored into the full-text index (external content, kept in sync by triggers)
+FTS_COLUMNS = ("title", "year", "format", "notes", "version", "country", "language")
+
+def init_search_index():
+    if not SEARCH_USE_FTS:
+        return False
+    cols = ", ".join(FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{col}" for col in FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{col}" for col in FTS_COLUMNS)
+    with closing(get_db()) as conn:
+        c = conn.cursor()
+        exists = c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'movies_fts'").fetchone()
+        try:
+            c.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+                    {cols}, content='movies', content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            print("Full-text search unavailable, falling back to LIKE:", e)
+            return False
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS movies_fts_ai AFTER INSERT ON movies BEGIN
+                INSERT INTO movies_fts(rowid, {cols}) VALUES (new.rowid, {new_cols});
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS movies_fts_ad AFTER DELETE ON movies BEGIN
+                INSERT INTO movies_fts(movies_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS movies_fts_au AFTER UPDATE OF {cols} ON movies BEGIN
+                INSERT INTO movies_fts(movies_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+                INSERT INTO movies_fts(rowid, {cols}) VALUES (new.rowid, {new_cols});
+            END
+        """)
+        if not exists:
+            # index rows that predate the FTS table
+            c.execute("INSERT INTO movies_fts(movies_fts) VALUES ('rebuild')")
+        conn.commit()
+    return True
+
+def fts_query(text):
+    # every word must match as a prefix: 'star wa' -> '"star"* "wa"*'
+    terms = [t.replace('"', '') for t in text.split()]
+    return " ".join(f'"{t}"*' for t in terms if t)
+
 init_db()
+FTS_ENABLED = init_search_index()
+tmdb_cache.init_cache()
+title_index.init_index()
+identify_queue.init_queue()
+poster_cache.init_cache()
 
 # === TMDb KEY SETTER ===
 @app.route("/set_tmdb_key", methods=["POST"])
@@ -106,51 +342,103 @@ def set_tmdb_key():
     return "TMDb API key updated successfully. Please restart the app.", 200
 
 # === TMDb LOOKUP ===
+def search_tmdb(title_guess, year_guess=None, merge=False):
+    # raw search/movie results, shared by lookup_tmdb and /tmdb_suggestions via the cache
+    if not title_guess:
+        return []
+    # a confident match in the local title index needs no API call (and works offline); merge=True (the
+    # suggestions list) takes the index's near matches too and still adds the API's results after them
+    local = title_index.search(title_guess, year_guess, suggest=merge)
+    if local and not merge:
+        return local
+    if not tmdb_key_set():
+        return local
+    year = tmdb_cache.normalize_year(year_guess)
+    key = tmdb_cache.search_key(title_guess, year)
+    results = tmdb_cache.get('search', key)
+    if results is tmdb_cache.MISS:
+        params = {"api_key": TMDB_API_KEY, "query": title_guess}
+        if year:
+            params["year"] = year
+        try:
+            results = tmdb_client.get("search/movie", params).get("results", [])[:20]
+        except Exception as e:
+            # the local matches are still worth showing; without any, the caller sees the error
+            if not local:
+                raise
+            print("TMDb search error:", e)
+            metrics.inc("app_errors_total", source="tmdb_search")
+            return local
+        tmdb_cache.put('search', key, results)
+    seen = {m["id"] for m in local}
+    return (local + [m for m in results if m.get("id") not in seen])[:20]
+
+def resolve_tmdb(title_guess, year_guess=None):
+    # best match or None; network errors propagate so the identify queue can retry
+    results = search_tmdb(title_guess, year_guess)
+    if not results:
+        return None
+    movie = results[0]
+    title = movie.get("title")
+    year = (movie.get("release_date") or "")[:4]
+    poster_path = movie.get("poster_path")
+    tmdb_id = movie.get("id")
+    if poster_path:
+        poster_path = f"https://image.tmdb.org/t/p/{TMDB_POSTER_SIZE}{poster_path}"
+    return title, year, poster_path, tmdb_id
+
 def lookup_tmdb(title_guess, year_guess=None):
-    if not title_guess or TMDB_API_KEY == "YOUR_TMDB_API_KEY_HERE":
+    if not title_guess or not identification_available():
         return None, None, None, None
     try:
-        url = "https://api.themoviedb.org/3/search/movie"
-        params = {"api_key": TMDB_API_KEY, "query": title_guess}
-        if year_guess:
-            params["year"] = year_guess
-        r = requests.get(url, params=params, timeout=10)
-        r.raise_for_status()
-        results = r.json().get("results", [])
-        if results:
-            movie = results[0]
-            title = movie.get("title")
-            year = movie.get("release_date", "")[:4]
-            poster_path = movie.get("poster_path")
-            tmdb_id = movie.get("id")
-            if poster_path:
-                poster_path = f"https://image.tmdb.org/t/p/{TMDB_POSTER_SIZE}{poster_path}"
-            return title, year, poster_path, tmdb_id
+        match = resolve_tmdb(title_guess, year_guess)
+        if match:
+            return match
     except Exception as e:
         print("TMDb lookup error:", e)
+        metrics.inc("app_errors_total", source="tmdb_lookup")
     return None, None, None, None
 
 # === TMDb MOVIE DETAILS ===
 def get_tmdb_movie_details(tmdb_id):
-    if not tmdb_id or TMDB_API_KEY == "YOUR_TMDB_API_KEY_HERE":
+    if not tmdb_id or not tmdb_key_set():
         return None
     try:
-        url = f"https://api.themoviedb.org/3/movie/{tmdb_id}"
-        params = {"api_key": TMDB_API_KEY}
-        r = requests.get(url, params=params, timeout=10)
-        r.raise_for_status()
-        movie = r.json()
-        collection = movie.get("belongs_to_collection")
+        key = tmdb_cache.movie_key(tmdb_id)
+        collection = tmdb_cache.get('movie', key)
+        if collection is tmdb_cache.MISS:
+            params = {"api_key": TMDB_API_KEY}
+            movie = tmdb_client.get(f"movie/{key}", params, endpoint="movie")
+            collection = movie.get("belongs_to_collection")
+            if collection:
+                collection = {"name": collection.get("name"), "id": collection.get("id")}
+            tmdb_cache.put('movie', key, collection)
         if collection:
-            return {"name": collection.get("name"), "id": collection.get("id")}
+            return collection
     except Exception as e:
         print("TMDb movie details error:", e)
+        metrics.inc("app_errors_total", source="tmdb_details")
     return None
 
+def identification_available():
+    # the API, or at least a loaded local title index
+    return tmdb_key_set() or title_index.available()
+
+def background_identify_enabled():
+    # the queue can run on the local title index alone; it is started the first time identification is
+    # possible, since the index may be loaded (from the CLI) after the app starts
+    # (it writes, so check before opening a write transaction of your own)
+    if not (BACKGROUND_IDENTIFY and identification_available()):
+        return False
+    return identify_queue.start(resolve_tmdb)
+
+# resumes jobs left queued by the last run
+background_identify_enabled()
+
 # === CONTEXT PROCESSOR ===
 @app.context_processor
 def inject_api_key_status():
-    return {"tmdb_key_set": bool(TMDB_API_KEY and TMDB_API_KEY != "YOUR_TMDB_API_KEY_HERE")}
+    return {"tmdb_key_set": tmdb_key_set()}
 
 # === ROUTES ===
 @app.route("/")
@@ -188,6 +476,50 @@ def set_catalogue_title():
         f.writelines(lines)
     return "Title updated successfully", 200
 
+# --- BARCODES ---
+BARCODE_COLUMNS = "rowid, barcode, title, year, format, status, poster_path, tmdb_id"
+
+def find_by_barcode(conn, barcode):
+    # one indexed lookup; prefer an owned copy, then an identified one, then the oldest
+    return conn.execute(f"""
+        SELECT {BARCODE_COLUMNS} FROM movies
+        WHERE barcode = ?
+        ORDER BY status = 'owned' DESC, tmdb_id IS NOT NULL DESC, rowid
+        LIMIT 1
+    """, (barcode,)).fetchone()
+
+@app.route("/api/barcode/<code>")
+def api_barcode(code):
+    barcode = normalize_barcode(code)
+    if not barcode:
+        return jsonify({"error": "Invalid barcode"}), 400
+    with closing(get_db()) as conn:
+        rows = conn.execute(
+            f"SELECT {BARCODE_COLUMNS} FROM movies WHERE barcode = ? ORDER BY rowid", (barcode,)
+        ).fetchall()
+    movies = [dict(r) for r in rows]
+    if any(m["status"] == "owned" for m in movies):
+        state = "owned"
+    elif movies:
+        state = "wanted"
+    else:
+        state = "new"
+    return jsonify({"barcode": barcode, "state": state, "movies": movies})
+
+def scan_barcode(barcode):
+    # scan mode: answer from the catalogue before any TMDb call -> (result, movie or None)
+    with closing(get_db()) as conn:
+        row = find_by_barcode(conn, barcode)
+        if row is None:
+            return "new", None
+        movie = dict(row)
+        if movie["status"] == "owned":
+            return "owned", movie
+        conn.execute("UPDATE movies SET status = 'owned' WHERE rowid = ?", (movie["rowid"],))
+        conn.commit()
+    movie["status"] = "owned"
+    return "promoted", movie
+
 # --- ADD MOVIE ---
 @app.route("/add", methods=["POST"])
 def add_movie():
@@ -216,16 +548,47 @@ def add_movie():
         region = request.form.get("region") or None
         disc_count = request.form.get("disc_count") or None
         notes = request.form.get("notes") or None
+    data = data if request.is_json else request.form
+    barcode = normalize_barcode(barcode)
+    # scan=1: a known barcode is reported (or promoted from wanted to owned) instead of added again
+    scan = str(data.get("scan") or "").lower() in ("1", "true", "yes", "on")
+    wants_json = request.is_json or request.headers.get("X-Requested-With") == "XMLHttpRequest"
+
+    if scan and not barcode:
+        if request.is_json:
+            return jsonify({"error": "Scan mode needs a barcode"}), 400
+        # the add form keeps its scan box ticked; without a barcode it is an ordinary add
+        scan = False
+    if scan:
+        result, movie = scan_barcode(barcode)
+        if movie or not title_guess:
+            if not wants_json:
+                return redirect("/catalogue")
+            return jsonify({"scan_result": result, "barcode": barcode, **(movie or {})})
 
     if not title_guess:
         return "Title cannot be empty", 400
 
-    title, year, poster_path, tmdb_id = lookup_tmdb(title_guess, year_guess)
-    if not title:
-        title = title_guess
-        year = year_guess
-        poster_path = None
-        tmdb_id = None
+    # another copy of a disc we already identified reuses that identification (no TMDb call)
+    known = None
+    if barcode:
+        with closing(get_db()) as conn:
+            known = find_by_barcode(conn, barcode)
+
+    identify_state = None
+    if known and known["tmdb_id"]:
+        title, year, poster_path, tmdb_id = known["title"], known["year"], known["poster_path"], known["tmdb_id"]
+    elif background_identify_enabled():
+        # store the guess now and let the identify queue fill in TMDb data
+        title, year, poster_path, tmdb_id = title_guess, year_guess, None, None
+        identify_state = "pending"
+    else:
+        title, year, poster_path, tmdb_id = lookup_tmdb(title_guess, year_guess)
+        if not title:
+            title = title_guess
+            year = year_guess
+            poster_path = None
+            tmdb_id = None
 
     with closing(get_db()) as conn:
         c = conn.cursor()
@@ -235,12 +598,18 @@ def add_movie():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (barcode, title, year, format_, poster_path, tmdb_id, status,
               version, country, language, region, disc_count, notes))
-        conn.commit()
         rowid = c.lastrowid
+        if identify_state:
+            identify_queue.enqueue(conn, [(rowid, title, year)])
+        conn.commit()
+    if identify_state:
+        identify_queue.notify()
 
-    if request.is_json or request.headers.get("X-Requested-With") == "XMLHttpRequest":
+    if wants_json:
         return jsonify({
             "rowid": rowid,
+            "scan_result": "added" if scan else None,
+            "duplicate_of": known["rowid"] if known else None,
             "title": title,
             "year": year,
             "tmdb_id": tmdb_id,
@@ -252,7 +621,8 @@ def add_movie():
             "region": region,
             "disc_count": disc_count,
             "notes": notes,
-            "poster_path": poster_path
+            "poster_path": poster_path,
+            "identify_state": identify_state
         })
 
     return redirect("/catalogue")
@@ -275,22 +645,58 @@ def edit_movie(rowid):
     if not new_title:
         return "Title cannot be empty", 400
 
-    title, year, poster_path, tmdb_id = lookup_tmdb(new_title, new_year)
-    if not title:
-        title = new_title
-        year = new_year
-        poster_path = None
-        tmdb_id = None
-    # prefer client-provided tmdb_id if present
-    provided_tmdb = data.get('tmdb_id') if isinstance(data, dict) else None
-    if provided_tmdb:
-        try:
-            tmdb_id = int(provided_tmdb)
-        except Exception:
-            pass
+    # client may force a fresh TMDb match even when title/year are unchanged
+    reidentify = str(data.get("reidentify") or "").lower() in ("1", "true", "yes", "on")
 
     with closing(get_db()) as conn:
         c = conn.cursor()
+        current = c.execute(
+            "SELECT title, year, poster_path, tmdb_id FROM movies WHERE rowid = ?", (rowid,)
+        ).fetchone()
+        if not current:
+            return "Movie not found", 404
+
+        title_changed = new_title != (current["title"] or "").strip()
+        year_changed = str(new_year or "").strip() != str(current["year"] or "").strip()
+        identified = False
+        skipped = None
+        match = None
+        if reidentify or title_changed or year_changed:
+            if not identification_available():
+                skipped = "no TMDb API key or local title index"
+            else:
+                try:
+                    match = resolve_tmdb(new_title, new_year)
+                    if match or tmdb_key_set():
+                        identified = True
+                    else:
+                        skipped = "no local title index match and no TMDb API key"
+                except Exception as e:
+                    print("TMDb lookup error:", e)
+                    metrics.inc("app_errors_total", source="tmdb_lookup")
+                    skipped = f"TMDb lookup failed: {e}"
+        if match:
+            title, year, poster_path, tmdb_id = match
+        elif identified or title_changed or year_changed:
+            # searched without a match, or the old match no longer fits the edited title/year
+            title = new_title
+            year = new_year
+            poster_path = None
+            tmdb_id = None
+        else:
+            # metadata-only edit, or a forced lookup that couldn't run: keep the stored identification
+            title = new_title
+            year = new_year
+            poster_path = current["poster_path"]
+            tmdb_id = current["tmdb_id"]
+        # prefer client-provided tmdb_id if present
+        provided_tmdb = data.get('tmdb_id')
+        if provided_tmdb:
+            try:
+                tmdb_id = int(provided_tmdb)
+            except Exception:
+                pass
+
         c.execute("""
             UPDATE movies
             SET title = ?, year = ?, format = ?, poster_path = ?, tmdb_id = ?, status = ?,
@@ -298,45 +704,21 @@ def edit_movie(rowid):
             WHERE rowid = ?
         """, (title, year, new_format, poster_path, tmdb_id, new_status,
               version, country, language, region, disc_count, notes, rowid))
-        conn.commit()
 
-    # handle collections (client may send a list of collection names or a comma-separated string)
-    try:
-        coll_input = data.get('collections') if isinstance(data, dict) else data.get('collections')
-        coll_names = []
-        if coll_input:
-            if isinstance(coll_input, list):
-                coll_names = [str(x).strip() for x in coll_input if str(x).strip()]
-            else:
-                coll_names = [x.strip() for x in str(coll_input).split(',') if x.strip()]
-        if coll_names:
-            with closing(get_db()) as conn:
-                c = conn.cursor()
-                # ensure collections exist
-                coll_ids = []
-                for name in coll_names:
-                    c.execute("SELECT id FROM collections WHERE name = ? COLLATE NOCASE", (name,))
-                    r = c.fetchone()
-                    if r:
-                        coll_ids.append(r[0])
-                    else:
-                        c.execute("INSERT INTO collections (name) VALUES (?)", (name,))
-                        coll_ids.append(c.lastrowid)
-                # clear existing associations
-                c.execute("DELETE FROM movie_collections WHERE movie_rowid = ?", (rowid,))
-                # insert new
-                for cid in coll_ids:
-                    c.execute("INSERT OR IGNORE INTO movie_collections (movie_rowid, collection_id) VALUES (?, ?)", (rowid, cid))
-                conn.commit()
-        else:
-            # if empty list provided, remove associations
-            if 'collections' in (data if isinstance(data, dict) else {}):
-                with closing(get_db()) as conn:
-                    c = conn.cursor()
-                    c.execute("DELETE FROM movie_collections WHERE movie_rowid = ?", (rowid,))
-                    conn.commit()
-    except Exception:
-        pass
+        # handle collections (client may send a list of collection names or a comma-separated string)
+        if 'collections' in data:
+            try:
+                # replace existing associations (an empty list removes them all)
+                collection_service.set_movie_collections(
+                    conn, rowid, collection_service.parse_names(data.get('collections')))
+            except sqlite3.Error as e:
+                conn.rollback()
+                print("Collection update error:", e)
+                metrics.inc("app_errors_total", source="collection_update")
+                return jsonify({"error": f"Could not update collections: {e}"}), 500
+
+        # movie fields and collections land together or not at all
+        conn.commit()
 
     return jsonify({
         "rowid": rowid,
@@ -351,7 +733,9 @@ def edit_movie(rowid):
         "region": region,
         "disc_count": disc_count,
         "notes": notes,
-        "poster_path": poster_path
+        "poster_path": poster_path,
+        "reidentified": identified,
+        "reidentify_skipped": skipped
     })
 
 # --- DELETE MOVIE ---
@@ -429,59 +813,198 @@ def add_bulk_collections():
     if not data or 'rowids' not in data or 'collections' not in data:
         return jsonify({"error": "rowids and collections required"}), 400
     rowids = [int(r) for r in data.get('rowids') if str(r).isdigit()]
-    coll_in = data.get('collections') or []
-    coll_names = []
-    if isinstance(coll_in, list):
-        coll_names = [str(x).strip() for x in coll_in if str(x).strip()]
-    else:
-        coll_names = [x.strip() for x in str(coll_in).split(',') if x.strip()]
+    coll_names = collection_service.parse_names(data.get('collections'))
     if not rowids or not coll_names:
         return jsonify({"added": 0})
-    added = 0
     with closing(get_db()) as conn:
-        c = conn.cursor()
-        coll_ids = []
-        for name in coll_names:
-            c.execute("SELECT id FROM collections WHERE name = ? COLLATE NOCASE", (name,))
-            r = c.fetchone()
-            if r:
-                coll_ids.append(r[0])
-            else:
-                c.execute("INSERT INTO collections (name) VALUES (?)", (name,))
-                coll_ids.append(c.lastrowid)
-        # insert associations
-        for rid in rowids:
-            for cid in coll_ids:
-                c.execute("INSERT OR IGNORE INTO movie_collections (movie_rowid, collection_id) VALUES (?, ?)", (rid, cid))
-                # rowcount for sqlite with INSERT OR IGNORE is 1 if inserted, 0 if ignored
-                added += c.rowcount
-        conn.commit()
-    return jsonify({"added": added})
+        try:
+            colls = collection_service.ensure_collections(conn, coll_names)
+            added = collection_service.add_to_collections(conn, rowids, [cid for cid, _ in colls])
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            print("Bulk collection error:", e)
+            metrics.inc("app_errors_total", source="bulk_collections")
+            return jsonify({"error": f"Could not add to collections: {e}"}), 500
+    return jsonify({"added": added, "collections": [{"id": cid, "name": name} for cid, name in colls]})
 
 # --- TMDb Suggestions ---
 @app.route("/tmdb_suggestions")
 def tmdb_suggestions():
-    if TMDB_API_KEY == "YOUR_TMDB_API_KEY_HERE":
+    if not identification_available():
         return jsonify([])
     title = request.args.get("title")
     year = request.args.get("year")
     if not title:
         return jsonify([])
-    params = {"api_key": TMDB_API_KEY, "query": title}
-    if year:
-        params["year"] = year
-    r = requests.get("https://api.themoviedb.org/3/search/movie", params=params)
-    results = r.json().get("results", [])
+    try:
+        results = search_tmdb(title, year, merge=True)
+    except Exception as e:
+        print("TMDb suggestions error:", e)
+        metrics.inc("app_errors_total", source="tmdb_suggestions")
+        results = []
     return jsonify(results[:20])
 
 
+@app.route("/api/tmdb_cache")
+def api_tmdb_cache():
+    return jsonify(tmdb_cache.stats())
+
+
+@app.route("/api/title_index")
+def api_title_index():
+    return jsonify(title_index.stats())
+
+
+@app.route("/api/tmdb_stats")
+def api_tmdb_stats():
+    return jsonify({"cache": tmdb_cache.stats(), "client": tmdb_client.stats()})
+
+
+# === POSTERS ===
+# versioned poster URLs (?v=<TMDb file name>) never change content, so browsers may keep them for a year
+POSTER_MAX_AGE = 365 * 24 * 3600
+POSTER_UNVERSIONED_MAX_AGE = 3600
+
+@app.route("/poster/<int:rowid>")
+@app.route("/poster/tmdb/<int:tmdb_id>")
+def poster(rowid=None, tmdb_id=None):
+    with closing(get_db()) as conn:
+        if rowid is not None:
+            row = conn.execute("SELECT poster_path FROM movies WHERE rowid = ?", (rowid,)).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT poster_path FROM movies WHERE tmdb_id = ? AND poster_path IS NOT NULL LIMIT 1",
+                (tmdb_id,)
+            ).fetchone()
+    if not row or not row["poster_path"]:
+        return jsonify({"error": "No poster"}), 404
+    url = poster_cache.sized_url(row["poster_path"], request.args.get("size"))
+    if not poster_cache.is_cacheable(url):
+        return redirect(url)
+    entry = poster_cache.get(url)
+    if entry is None:
+        # not cached and TMDb unreachable
+        return jsonify({"error": "Poster unavailable"}), 503
+    versioned = request.args.get("v") == url.rsplit("/", 1)[-1]
+    response = send_file(entry["path"], mimetype=entry["content_type"], etag=entry["sha"], conditional=True,
+                         max_age=POSTER_MAX_AGE if versioned else POSTER_UNVERSIONED_MAX_AGE)
+    response.cache_control.public = True
+    if versioned:
+        response.cache_control.immutable = True
+    return response
+
+
+@app.route("/api/poster_cache")
+def api_poster_cache():
+    return jsonify(poster_cache.stats())
+
+
+def catalogue_poster_urls(size=None):
+    with closing(get_db()) as conn:
+        rows = conn.execute("SELECT DISTINCT poster_path FROM movies WHERE poster_path IS NOT NULL").fetchall()
+    return [poster_cache.sized_url(r["poster_path"], size) for r in rows]
+
+
+def data_version(conn, name):
+    row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def cached_response(version_name):
+    # serve repeat GETs from response_cache until data_versions[version_name] moves, with strong ETags
+    # (304 on match) and gzip/brotli bodies; only 200 responses are cached
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with closing(get_db()) as conn:
+                version = data_version(conn, version_name)
+            key = (request.path, tuple(sorted((k, v.strip()) for k, v in request.args.items(multi=True))))
+            entry = response_cache.get(version_name, version, key)
+            if entry is None:
+                resp = app.make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+                entry = response_cache.put(version_name, version, key, resp.get_data(), resp.mimetype)
+            encoding = response_cache.choose_encoding(request.accept_encodings, len(entry.body))
+            etag = entry.etag_for(encoding)
+            if request.if_none_match.contains(etag):
+                response_cache.note_not_modified()
+                resp = Response(status=304)
+            else:
+                resp = Response(entry.encoded(encoding), mimetype=entry.mimetype)
+                if encoding:
+                    resp.headers["Content-Encoding"] = encoding
+            resp.set_etag(etag)
+            resp.headers["Cache-Control"] = "no-cache"
+            resp.vary.add("Accept-Encoding")
+            return resp
+        return wrapper
+    return decorator
+
+
+@app.route("/api/response_cache")
+def api_response_cache():
+    return jsonify(response_cache.stats())
+
+
+# --- METRICS ---
+def cache_metrics():
+    # scrape-time view of the statistics each cache and pool already keeps
+    tmdb = tmdb_cache.stats()
+    responses = response_cache.stats()
+    posters = poster_cache.stats()
+    pool = db.pool_stats()
+    queue_states = identify_queue.status()["states"]
+    return [
+        ("tmdb_cache_hits_total", "counter", "TMDb cache hits by tier", {"tier": "memory"}, tmdb["memory_hits"]),
+        ("tmdb_cache_hits_total", "counter", "TMDb cache hits by tier", {"tier": "db"}, tmdb["db_hits"]),
+        ("tmdb_cache_misses_total", "counter", "TMDb cache misses", {}, tmdb["misses"]),
+        ("response_cache_hits_total", "counter", "Cached API responses served", {}, responses["hits"]),
+        ("response_cache_misses_total", "counter", "API responses rendered and cached", {}, responses["misses"]),
+        ("response_cache_not_modified_total", "counter", "304 responses to If-None-Match", {},
+         responses["not_modified"]),
+        ("response_cache_entries", "gauge", "Responses held in memory", {}, responses["entries"]),
+        ("poster_cache_hits_total", "counter", "Posters served from disk", {}, posters["hits"]),
+        ("poster_cache_misses_total", "counter", "Posters downloaded on demand", {}, posters["misses"]),
+        ("poster_cache_fetch_errors_total", "counter", "Poster downloads that failed", {}, posters["fetch_errors"]),
+        ("poster_cache_evicted_total", "counter", "Poster URLs evicted", {}, posters["evicted"]),
+        ("poster_cache_bytes", "gauge", "Poster bytes on disk", {}, posters["bytes"]),
+        ("sqlite_pool_idle_connections", "gauge", "Idle pooled connections", {}, pool["idle"]),
+    ] + [("identify_jobs", "gauge", "Identify queue jobs by state", {"state": state}, n)
+         for state, n in queue_states.items()]
+
+metrics.register(cache_metrics)
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    if not metrics.ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/slow_queries")
+def api_slow_queries():
+    return jsonify({"threshold_ms": metrics.SLOW_QUERY_MS, "queries": metrics.slow_queries()})
+
+
 @app.route('/api/collections')
 def api_collections():
     with closing(get_db()) as conn:
         c = conn.cursor()
-        rows = c.execute("SELECT id, name, (SELECT COUNT(*) FROM movie_collections mc WHERE mc.collection_id = collections.id) as count FROM collections ORDER BY name COLLATE NOCASE ASC").fetchall()
-        cols = [{'id': r[0], 'name': r[1], 'count': r[2]} for r in rows]
-    return jsonify(cols)
+        # every change to collections (including movie_count) bumps this version
+        etag = f"collections-{data_version(conn, 'collections')}"
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            rows = c.execute("SELECT id, name, movie_count FROM collections ORDER BY name COLLATE NOCASE ASC").fetchall()
+            cols = [{'id': r[0], 'name': r[1], 'count': r[2]} for r in rows]
+            resp = jsonify(cols)
+    resp.set_etag(etag)
+    # browsers must revalidate, which costs one indexed lookup and usually returns 304
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 
 @app.route('/api/collection/<int:cid>/movies')
@@ -499,6 +1022,22 @@ def api_collection_movies(cid):
     return jsonify(movies)
 
 
+@app.route('/api/movie_collections', methods=['GET', 'POST'])
+def api_movie_collections_batch():
+    # memberships for many movies at once: ?rowids=1,2,3 or JSON {"rowids": [1, 2, 3]}
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        raw = data.get('rowids') or []
+    else:
+        raw = request.args.get('rowids', '').split(',')
+    rowids = list(dict.fromkeys(int(r) for r in raw if str(r).strip().isdigit()))
+    if len(rowids) > MAX_BATCH_ROWIDS:
+        return jsonify({"error": f"at most {MAX_BATCH_ROWIDS} rowids per request"}), 400
+    with closing(get_db()) as conn:
+        names = collection_service.memberships(conn, rowids)
+    return jsonify({str(rowid): names[rowid] for rowid in rowids})
+
+
 @app.route('/api/movie_collections/<int:rowid>')
 def api_movie_collections(rowid):
     with closing(get_db()) as conn:
@@ -537,51 +1076,156 @@ def update_movie(rowid):
     return "", 204
 
 # --- SEARCH API ---
-@app.route("/api/search")
-def api_search():
-    page = request.args.get("page", 1, type=int)
-    query = request.args.get("q", "").strip()
-    sort = request.args.get("sort", "recent")
-    starts_with = request.args.get("starts_with", "").strip()
-    status = request.args.get("status", "")
-    # optional page_size param (client-controlled). Validate and cap to MAX_PAGE_SIZE
-    page_size = request.args.get('page_size', type=int)
-    if not page_size or page_size < 1:
-        page_size = PAGE_SIZE
-    else:
-        page_size = min(page_size, MAX_PAGE_SIZE)
+# sort mode -> (key expressions, direction); rowid last so every key is unique for keyset paging
+SORT_KEYS = {
+    "recent": (["movies.rowid"], "DESC"),
+    "alpha": (["title COLLATE NOCASE", "movies.rowid"], "ASC"),
+    "year_desc": (["year_int", "title COLLATE NOCASE", "movies.rowid"], "DESC"),
+    "year_asc": (["year_int", "title COLLATE NOCASE", "movies.rowid"], "ASC"),
+    "format": (["COALESCE(format, '') COLLATE NOCASE", "title COLLATE NOCASE", "movies.rowid"], "ASC"),
+    "relevance": (["fts.fts_rank", "movies.rowid"], "ASC"),
+}
+
+# columns a client may request with fields=; rowid is always returned
+SEARCH_FIELDS = ("rowid", "barcode", "title", "year", "format", "poster_path", "tmdb_id", "status",
+                 "version", "country", "language", "region", "disc_count", "notes")
+# what the poster grid renders
+GRID_FIELDS = ("rowid", "title", "year", "format", "status", "poster_path")
+
+def parse_fields(raw):
+    # -> (fields, error); no fields= means every column
+    requested = [f.strip() for f in (raw or "").split(",") if f.strip()]
+    if not requested:
+        return list(SEARCH_FIELDS), None
+    unknown = [f for f in requested if f not in SEARCH_FIELDS]
+    if unknown:
+        return None, f"Unknown field(s): {', '.join(unknown)}"
+    return ["rowid"] + [f for f in dict.fromkeys(requested) if f != "rowid"], None
+
+def encode_cursor(sort, values):
+    raw = json.dumps({"s": sort, "k": values}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token, sort):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+    except Exception:
+        raise ValueError("malformed cursor")
+    if not isinstance(data, dict) or data.get("s") != sort:
+        raise ValueError("cursor belongs to a different sort")
+    key_exprs = SORT_KEYS[sort][0]
+    values = data.get("k")
+    if not isinstance(values, list) or len(values) != len(key_exprs):
+        raise ValueError("cursor key mismatch")
+    # each key is bound as an SQL parameter: scalars only, and the trailing rowid must be an integer
+    for expr, value in zip(key_exprs, values):
+        if isinstance(value, bool) or not isinstance(value, (str, int, float, type(None))):
+            raise ValueError("cursor key mismatch")
+        if expr == "movies.rowid" and not isinstance(value, int):
+            raise ValueError("cursor key mismatch")
+    return values
+
+# search totals per filter, valid until the catalogue data version moves; pages of the same search reuse one
+# count instead of re-counting every match per page
+COUNT_CACHE_SIZE = 256
+_count_cache = {'version': None, 'totals': {}}
+_count_cache_lock = threading.Lock()
+
+def count_matches(conn, join_sql, where_sql, params):
+    version = data_version(conn, "catalogue")
+    key = (join_sql, where_sql, tuple(params))
+    with _count_cache_lock:
+        if _count_cache['version'] == version and key in _count_cache['totals']:
+            return _count_cache['totals'][key]
+    total = conn.execute(f"SELECT COUNT(*) FROM movies {join_sql} {where_sql}", params).fetchone()[0]
+    with _count_cache_lock:
+        if _count_cache['version'] != version:
+            _count_cache.update(version=version, totals={})
+        totals = _count_cache['totals']
+        if len(totals) >= COUNT_CACHE_SIZE:
+            totals.pop(next(iter(totals)))
+        totals[key] = total
+    return total
+
+def _strip_sort_keys(row):
+    return {k: row[k] for k in row.keys() if not k.startswith("sort_key_")}
+
+def _embed_collections(movies):
+    with closing(get_db()) as conn:
+        names = collection_service.memberships(conn, [m["rowid"] for m in movies])
+    for m in movies:
+        m["collections"] = names.get(m["rowid"], [])
+
+def search_conditions(args):
+    # filters shared by /api/search and /api/facets -> (join_sql, join_params, [(filter, clause, params)]);
+    # each clause is tagged with its filter so facets can leave their own one out
+    query = args.get("q", "").strip()
+    starts_with = args.get("starts_with", "").strip()
+    status = args.get("status", "")
     # formats: comma-separated list
-    formats_raw = request.args.get("formats", "").strip()
+    formats_raw = args.get("formats", "").strip()
     formats = [f.strip() for f in formats_raw.split(",") if f.strip()] if formats_raw else []
-
-    # Build WHERE clauses and params first so we can compute total correctly
-    where_clauses = []
-    params = []
+    join_sql = ""
+    join_params = []
+    conditions = []
 
     # status filter: empty means no status filtering (both)
     if status:
-        where_clauses.append("status = ?")
-        params.append(status)
+        conditions.append(("status", "status = ?", [status]))
 
     if starts_with:
-        where_clauses.append("title LIKE ?")
-        params.append(f"{starts_with}%")
+        conditions.append(("query", "title LIKE ?", [f"{starts_with}%"]))
     elif query:
-        q = f"%{query}%"
-        where_clauses.append("(title LIKE ? OR year LIKE ? OR format LIKE ?)")
-        params.extend([q, q, q])
+        match = fts_query(query) if FTS_ENABLED else ""
+        if match:
+            # ranked prefix match from the FTS index instead of a full-table LIKE scan
+            join_sql = ("JOIN (SELECT rowid AS fts_rowid, rank AS fts_rank FROM movies_fts WHERE movies_fts MATCH ?) fts "
+                        "ON fts.fts_rowid = movies.rowid")
+            join_params.append(match)
+        else:
+            q = f"%{query}%"
+            conditions.append(("query", "(title LIKE ? OR year LIKE ? OR format LIKE ?)", [q, q, q]))
+
+    # year range filter on the indexed integer year
+    year_from = args.get("year_from", type=int)
+    year_to = args.get("year_to", type=int)
+    if year_from:
+        conditions.append(("year", "year_int >= ?", [year_from]))
+    if year_to:
+        conditions.append(("year", "year_int BETWEEN 1 AND ?", [year_to]))
 
     # formats filter (IN clause)
     if formats:
         placeholders = ",".join(["?"] * len(formats))
-        where_clauses.append(f"format IN ({placeholders})")
-        params.extend(formats)
+        conditions.append(("format", f"format IN ({placeholders})", formats))
 
-    where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    return join_sql, join_params, conditions
 
-    # compute total now that where_sql and params are available
-    with closing(get_db()) as conn:
-        total = conn.execute(f"SELECT COUNT(*) FROM movies {where_sql}", params).fetchone()[0]
+@app.route("/api/search")
+@cached_response("catalogue")
+def api_search():
+    page = request.args.get("page", 1, type=int)
+    sort = request.args.get("sort", "recent")
+    # optional page_size param (client-controlled). Validate and cap to MAX_PAGE_SIZE
+    page_size = request.args.get('page_size', type=int)
+    if not page_size or page_size < 1:
+        page_size = PAGE_SIZE
+    else:
+        page_size = min(page_size, MAX_PAGE_SIZE)
+    # include=collections embeds each movie's collection names (one extra query per page)
+    includes = {i.strip() for i in request.args.get("include", "").split(",") if i.strip()}
+    # fields=title,year,... narrows both the SELECT list and the JSON (see SEARCH_FIELDS)
+    fields, error = parse_fields(request.args.get("fields"))
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Build WHERE clauses and params first so we can compute total correctly
+    join_sql, join_params, conditions = search_conditions(request.args)
+    where_clauses = [clause for _, clause, _ in conditions]
+    params = [p for _, _, clause_params in conditions for p in clause_params]
+
+    where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
 
     # page_size handling: treat missing or non-positive values as default; clamp positive values
     if page_size is None or page_size < 1:
@@ -589,114 +1233,522 @@ def api_search():
     else:
         page_size = min(page_size, MAX_PAGE_SIZE)
 
-    offset = (page - 1) * page_size
-
     # Sorting options
-    if sort == "recent":
-        order_by = "rowid DESC"
-    elif sort == "alpha":
-        order_by = "title COLLATE NOCASE ASC"
-    elif sort == "year_desc":
-        order_by = "CAST(year AS INTEGER) DESC"
-    elif sort == "year_asc":
-        order_by = "CAST(year AS INTEGER) ASC"
-    elif sort == "format":
-        order_by = "format COLLATE NOCASE ASC, title COLLATE NOCASE ASC"
-    else:
-        order_by = "rowid DESC"
+    if sort not in SORT_KEYS or (sort == "relevance" and not join_sql):
+        sort = "recent"
+    key_exprs, direction = SORT_KEYS[sort]
+    order_by = ", ".join(f"{expr} {direction}" for expr in key_exprs)
+    key_cols = "".join(f", {expr} AS sort_key_{i}" for i, expr in enumerate(key_exprs))
+    columns = ", ".join("movies.rowid AS rowid" if f == "rowid" else f for f in fields) + key_cols
+
+    # keyset mode: any cursor param (empty for the first page) switches from LIMIT/OFFSET to seek
+    cursor = request.args.get("cursor")
+    if cursor is not None:
+        seek_params = []
+        if cursor:
+            try:
+                seek_params = decode_cursor(cursor, sort)
+            except ValueError:
+                return jsonify({"error": "Invalid cursor"}), 400
+            op = "<" if direction == "DESC" else ">"
+            seek = f"({', '.join(key_exprs)}) {op} ({', '.join(['?'] * len(key_exprs))})"
+            seek_where = f"{where_sql} AND {seek}" if where_sql else f"WHERE {seek}"
+        else:
+            seek_where = where_sql
+        with closing(get_db()) as conn:
+            # fetch one extra row to learn whether another page exists
+            rows = conn.execute(f"""
+                SELECT {columns}
+                FROM movies
+                {join_sql}
+                {seek_where}
+                ORDER BY {order_by}
+                LIMIT ?
+            """, (*join_params, *params, *seek_params, page_size + 1)).fetchall()
+            # the total is only counted on the first page (or on request); clients keep it
+            total = None
+            if not cursor or request.args.get("with_total") in ("1", "true"):
+                total = count_matches(conn, join_sql, where_sql, (*join_params, *params))
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_cursor(sort, [last[f"sort_key_{i}"] for i in range(len(key_exprs))])
+        movies = [_strip_sort_keys(m) for m in rows]
+        if "collections" in includes:
+            _embed_collections(movies)
+        return jsonify({
+            "movies": movies,
+            "total": total,
+            "next_cursor": next_cursor,
+            "page_size": page_size
+        })
+
+    offset = (page - 1) * page_size
 
     with closing(get_db()) as conn:
-        movies = conn.execute(f"""
-            SELECT rowid, barcode, title, year, format, poster_path, tmdb_id, status,
-                   version, country, language, region, disc_count, notes
+        # a plain ORDER BY ... LIMIT walks the sort's index and stops after the page (no window over every match)
+        rows = conn.execute(f"""
+            SELECT {columns}
             FROM movies
+            {join_sql}
             {where_sql}
             ORDER BY {order_by}
             LIMIT ? OFFSET ?
-        """, (*params, page_size, offset)).fetchall()
+        """, (*join_params, *params, page_size, offset)).fetchall()
+        # with_total=0 skips the count for clients that don't show page numbers
+        total = None
+        if request.args.get("with_total") not in ("0", "false"):
+            total = count_matches(conn, join_sql, where_sql, (*join_params, *params))
+    movies = [_strip_sort_keys(m) for m in rows]
+    if "collections" in includes:
+        _embed_collections(movies)
 
     return jsonify({
-        "movies": [dict(m) for m in movies],
+        "movies": movies,
         "total": total,
         "page": page,
-        "pages": (total + page_size - 1) // page_size,
+        "pages": (total + page_size - 1) // page_size if total is not None else None,
         "page_size": page_size
     })
 
+# --- FACETS ---
+# most frequent values returned for the open-ended facets
+FACET_LIMIT = getattr(config, 'FACET_LIMIT', 50)
+# facets that leave their own filter out, so every option counts what selecting it would give; their
+# filters are plain "column = ?" / "column IN (...)" tests, so they can be applied to grouped rows
+SELF_EXCLUDING_FACETS = ("status", "format")
+
+def _facet_list(counts, limit=None):
+    # most frequent first, ties by value (NULL first, as in SQL)
+    items = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0] is not None, kv[0]))
+    return [{"value": value, "count": count} for value, count in items[:limit]]
+
+@app.route("/api/facets")
+@cached_response("catalogue")
+def api_facets():
+    join_sql, join_params, conditions = search_conditions(request.args)
+    own = {name: set(p) for name, _, p in conditions if name in SELF_EXCLUDING_FACETS}
+
+    def where(terms):
+        sql = "WHERE " + " AND ".join(clause for _, clause, _ in terms) if terms else ""
+        return sql, [*join_params, *(v for _, _, p in terms for v in p)]
+
+    counts = {name: {} for name in ("status", "format", "decade", "country", "language", "collection")}
+    def add(facet, value, n):
+        counts[facet][value] = counts[facet].get(value, 0) + n
+
+    with closing(get_db()) as conn:
+        c = conn.cursor()
+        # facets are grouped straight off the filtered rows (no snapshot table): status x format x decade under
+        # every filter but status and format, whose own tests are then applied here to the ~100 groups
+        shared_sql, shared_params = where([t for t in conditions if t[0] not in SELF_EXCLUDING_FACETS])
+        total = 0
+        for r in c.execute(f"""
+            SELECT status, format, year_int / 10 * 10 AS decade, COUNT(*) AS count
+            FROM movies {join_sql}
+            {shared_sql}
+            GROUP BY status, format, decade
+        """, shared_params).fetchall():
+            passes = {name: r[name] in values for name, values in own.items()}
+            for name in SELF_EXCLUDING_FACETS:
+                if all(ok for other, ok in passes.items() if other != name):
+                    add(name, r[name], r["count"])
+            if all(passes.values()):
+                total += r["count"]
+                # unknown years aren't offered as a filter
+                if r["decade"]:
+                    add("decade", r["decade"], r["count"])
+
+        # country x language under every filter
+        where_sql, params = where(conditions)
+        for r in c.execute(f"""
+            SELECT country, language, COUNT(*) AS count
+            FROM movies {join_sql}
+            {where_sql}
+            GROUP BY country, language
+        """, params).fetchall():
+            for name in ("country", "language"):
+                if r[name]:
+                    add(name, r[name], r["count"])
+
+        rows = c.execute(f"""
+            SELECT col.id, col.name, COUNT(*) AS count
+            FROM movies {join_sql}
+            JOIN movie_collections mc ON mc.movie_rowid = movies.rowid
+            JOIN collections col ON col.id = mc.collection_id
+            {where_sql}
+            GROUP BY col.id ORDER BY count DESC, col.name COLLATE NOCASE
+            LIMIT ?
+        """, (*params, FACET_LIMIT)).fetchall()
+
+    facets = {
+        "status": _facet_list(counts["status"]),
+        "format": _facet_list(counts["format"]),
+        "decade": sorted(_facet_list(counts["decade"]), key=lambda f: f["value"]),
+        "country": _facet_list(counts["country"], FACET_LIMIT),
+        "language": _facet_list(counts["language"], FACET_LIMIT),
+        "collection": [{"value": r["name"], "id": r["id"], "count": r["count"]} for r in rows],
+    }
+    return jsonify({"total": total, "facets": facets})
+
 # --- EXPORT CSV ---
+EXPORT_COLUMNS = ["barcode", "title", "year", "format", "poster_path", "tmdb_id", "status",
+                  "version", "country", "language", "region", "disc_count", "notes"]
+
 @app.route("/export_csv")
 def export_csv():
-    with closing(get_db()) as conn:
-        c = conn.cursor()
-        c.execute("""
-            SELECT barcode, title, year, format, poster_path, tmdb_id, status,
-                   version, country, language, region, disc_count, notes
-            FROM movies
-            ORDER BY rowid ASC
-        """)
-        movies = c.fetchall()
+    # ?collections=1 adds each movie's collection names as a final column
+    with_collections = request.args.get("collections", "").lower() in ("1", "true", "yes")
+    header = EXPORT_COLUMNS + (["collections"] if with_collections else [])
+    coll_sql = ""
+    if with_collections:
+        coll_sql = """
+            LEFT JOIN (
+                SELECT mc.movie_rowid, GROUP_CONCAT(c.name, ', ') AS collections
+                FROM movie_collections mc JOIN collections c ON c.id = mc.collection_id
+                GROUP BY mc.movie_rowid
+            ) coll ON coll.movie_rowid = movies.rowid
+        """
+    sql = f"""
+        SELECT {", ".join(header)}
+        FROM movies
+        {coll_sql}
+        ORDER BY movies.rowid ASC
+    """
 
-    si = StringIO()
-    writer = csv.writer(si)
-    writer.writerow(["barcode", "title", "year", "format", "poster_path", "tmdb_id", "status",
-                     "version", "country", "language", "region", "disc_count", "notes"])
-    for m in movies:
-        writer.writerow([m["barcode"], m["title"], m["year"], m["format"], m["poster_path"], m["tmdb_id"], m["status"],
-                         m["version"], m["country"], m["language"], m["region"], m["disc_count"], m["notes"]])
-    si.seek(0)
-    return send_file(BytesIO(si.getvalue().encode("utf-8")),
-                     mimetype="text/csv",
-                     as_attachment=True,
-                     download_name=CSV_EXPORT_FILENAME)
+    def generate():
+        # rows are written and encoded batch by batch, so memory stays flat for any catalogue size
+        buf = StringIO()
+        writer = csv.writer(buf)
+
+        def flush():
+            chunk = buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+            return chunk.encode("utf-8")
+
+        writer.writerow(header)
+        yield flush()
+        # own connection: the request-scoped one is released before the body is streamed
+        conn = db.acquire()
+        try:
+            cur = conn.execute(sql)
+            while True:
+                rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                writer.writerows(tuple(r) for r in rows)
+                yield flush()
+        finally:
+            conn.close()
+
+    return Response(generate(), mimetype="text/csv",
+                    headers={"Content-Disposition": f'attachment; filename="{CSV_EXPORT_FILENAME}"'})
 
 # --- IMPORT CSV ---
+IMPORT_MODES = ("skip", "update", "duplicate")
+MOVIE_STATUSES = ("owned", "wanted")
+
+def normalize_import_row(row):
+    # returns (values, None) for a valid CSV row or (None, reason) for a rejected one
+    values = {col: (row.get(col) or "").strip() or None for col in EXPORT_COLUMNS}
+    if not values["title"]:
+        return None, "missing title"
+    for col in ("tmdb_id", "disc_count"):
+        if values[col] is not None:
+            try:
+                values[col] = int(values[col])
+            except ValueError:
+                return None, f"invalid {col}: {values[col]!r}"
+    # stored bare, like barcodes from /add, so scans and duplicate checks find the row
+    values["barcode"] = normalize_barcode(values["barcode"])
+    if values["status"]:
+        values["status"] = values["status"].lower()
+        if values["status"] not in MOVIE_STATUSES:
+            return None, f"invalid status: {values['status']!r}"
+    return values, None
+
 @app.route("/import_csv", methods=["POST"])
 def import_csv():
     file = request.files.get("csv_file")
     if not file or not file.filename.endswith(".csv"):
         return redirect("/catalogue")
+    # on_duplicate: skip rows whose barcode/tmdb_id already exist, update those rows, or insert anyway
+    mode = (request.form.get("on_duplicate") or request.args.get("on_duplicate") or IMPORT_DUPLICATE_MODE).lower()
+    if mode not in IMPORT_MODES:
+        return jsonify({"error": f"on_duplicate must be one of {', '.join(IMPORT_MODES)}"}), 400
+
+    # decode incrementally instead of reading the whole upload into memory
+    reader = csv.DictReader(io.TextIOWrapper(file.stream, encoding="utf-8-sig", errors="replace", newline=""))
+
+    report = {"inserted": 0, "updated": 0, "skipped": 0, "rejected": 0,
+              "skipped_rows": [], "rejected_rows": [], "queued": 0, "batch": None}
 
-    stream = StringIO(file.stream.read().decode("utf-8"))
-    reader = csv.DictReader(stream)
+    def note(kind, line, reason):
+        report[kind] += 1
+        if len(report[f"{kind}_rows"]) < IMPORT_REPORT_LIMIT:
+            report[f"{kind}_rows"].append({"line": line, "reason": reason})
 
+    insert_sql = f"""
+        INSERT INTO movies ({", ".join(EXPORT_COLUMNS)})
+        VALUES ({", ".join("?" * len(EXPORT_COLUMNS))})
+    """
+    # fields missing from the CSV keep their stored value on update
+    update_sql = f"""
+        UPDATE movies SET {", ".join(f"{col} = COALESCE(?, {col})" for col in EXPORT_COLUMNS)}
+        WHERE rowid = ?
+    """
+    seen_barcodes = set()
+    seen_tmdb_ids = set()
+
+    def flush(c, pending):
+        existing_barcodes = {}
+        existing_tmdb_ids = {}
+        if mode != "duplicate":
+            barcodes = list({v["barcode"] for _, v in pending if v["barcode"]})
+            tmdb_ids = list({v["tmdb_id"] for _, v in pending if v["tmdb_id"]})
+            if barcodes:
+                rows = c.execute(f"SELECT rowid, barcode FROM movies WHERE barcode IN ({','.join('?' * len(barcodes))})",
+                                 barcodes).fetchall()
+                existing_barcodes = {r["barcode"]: r["rowid"] for r in rows}
+            if tmdb_ids:
+                rows = c.execute(f"SELECT rowid, tmdb_id FROM movies WHERE tmdb_id IN ({','.join('?' * len(tmdb_ids))})",
+                                 tmdb_ids).fetchall()
+                existing_tmdb_ids = {r["tmdb_id"]: r["rowid"] for r in rows}
+        inserts = []
+        updates = []
+        for line, v in pending:
+            if mode != "duplicate":
+                match = existing_barcodes.get(v["barcode"]) or existing_tmdb_ids.get(v["tmdb_id"])
+                if match:
+                    if mode == "update":
+                        updates.append([v[col] for col in EXPORT_COLUMNS] + [match])
+                    else:
+                        note("skipped", line, f"already in catalogue (rowid {match})")
+                    continue
+                if (v["barcode"] and v["barcode"] in seen_barcodes) or (v["tmdb_id"] and v["tmdb_id"] in seen_tmdb_ids):
+                    note("skipped", line, "duplicate of an earlier row in this file")
+                    continue
+                if v["barcode"]:
+                    seen_barcodes.add(v["barcode"])
+                if v["tmdb_id"]:
+                    seen_tmdb_ids.add(v["tmdb_id"])
+            v["format"] = v["format"] or DEFAULT_FORMAT
+            v["status"] = v["status"] or DEFAULT_STATUS
+            inserts.append([v[col] for col in EXPORT_COLUMNS])
+        if inserts:
+            c.executemany(insert_sql, inserts)
+            report["inserted"] += len(inserts)
+        if updates:
+            c.executemany(update_sql, updates)
+            report["updated"] += len(updates)
+
+    # decided up front: starting the queue writes on another connection, which would wait on this import
+    identify = background_identify_enabled()
     with closing(get_db()) as conn:
         c = conn.cursor()
-        for row in reader:
-            title = (row.get("title") or "").strip()
-            if not title:
-                continue
-            c.execute("""
-                INSERT INTO movies (barcode, title, year, format, poster_path, tmdb_id, status,
-                                    version, country, language, region, disc_count, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                row.get("barcode") or None,
-                title,
-                row.get("year") or None,
-                row.get("format") or DEFAULT_FORMAT,
-                row.get("poster_path") or None,
-                int(row.get("tmdb_id")) if row.get("tmdb_id") else None,
-                row.get("status") or DEFAULT_STATUS,
-                row.get("version") or None,
-                row.get("country") or None,
-                row.get("language") or None,
-                row.get("region") or None,
-                row.get("disc_count") or None,
-                row.get("notes") or None
-            ))
-        conn.commit()
+        first_new_rowid = (c.execute("SELECT MAX(rowid) FROM movies").fetchone()[0] or 0) + 1
+        try:
+            pending = []
+            for row in reader:
+                values, reason = normalize_import_row(row)
+                if reason:
+                    note("rejected", reader.line_num, reason)
+                    continue
+                pending.append((reader.line_num, values))
+                if len(pending) >= IMPORT_BATCH_SIZE:
+                    flush(c, pending)
+                    pending = []
+            if pending:
+                flush(c, pending)
+            # rows imported without a tmdb_id are identified in the background
+            if report["inserted"] and identify:
+                batch = identify_queue.new_batch()
+                report["queued"] = identify_queue.enqueue_select(
+                    conn, "SELECT rowid, title, year FROM movies WHERE rowid >= ? AND tmdb_id IS NULL",
+                    (first_new_rowid,), batch)
+                report["batch"] = batch if report["queued"] else None
+            # the whole file lands in one transaction
+            conn.commit()
+        except (csv.Error, sqlite3.Error) as e:
+            conn.rollback()
+            print("CSV import error:", e)
+            metrics.inc("app_errors_total", source="csv_import")
+            if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+                return jsonify({"error": f"Import failed: {e}"}), 400
+            return redirect("/catalogue")
+    if report["queued"]:
+        identify_queue.notify()
 
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        return jsonify(report)
     return redirect("/catalogue")
 
+# --- IDENTIFY QUEUE STATUS ---
+@app.route("/api/identify_status")
+def api_identify_status():
+    # ?batch=<id> for one import, ?rowid=<id> for a single movie, nothing for the whole queue
+    rowid = request.args.get("rowid", type=int)
+    if rowid:
+        with closing(get_db()) as conn:
+            state = identify_queue.job_state(conn, rowid)
+        return jsonify({"rowid": rowid, "state": state})
+    return jsonify(identify_queue.status(request.args.get("batch") or None))
+
+# --- BULK RE-IDENTIFY ---
+def reidentify_rows(data):
+    # {"rowids": [...]} or {"filter": {"missing_tmdb": true, "status": "owned", ...}} -> rows, error
+    rowids = [int(r) for r in data.get("rowids") or [] if str(r).strip().isdigit()]
+    filters = data.get("filter") or {}
+    unknown = [k for k in filters if k not in reidentify.FILTERS]
+    if unknown:
+        return None, f"Unknown filter(s): {', '.join(unknown)}"
+    if not rowids and not filters:
+        return None, "Provide rowids or a filter"
+    with closing(get_db()) as conn:
+        return reidentify.select_rows(conn, rowids, filters), None
+
+def reidentify_collection_lookup():
+    return get_tmdb_movie_details if AUTO_ADD_COLLECTIONS else None
+
+@app.route("/api/reidentify", methods=["GET", "POST"])
+def api_reidentify():
+    if request.method == "GET":
+        return jsonify(reidentify.recent())
+    if not identification_available():
+        return jsonify({"error": "TMDb API key is not set and the local title index is empty"}), 400
+    rows, error = reidentify_rows(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        run = reidentify.start(rows, resolve_tmdb, reidentify_collection_lookup())
+    except reidentify.Busy as e:
+        return jsonify({"error": "A re-identify run is already in progress", "run": str(e)}), 409
+    return jsonify(run.snapshot()), 202
+
+@app.route("/api/reidentify/<run_id>")
+def api_reidentify_status(run_id):
+    run = reidentify.get(run_id)
+    if run is None:
+        return jsonify({"error": "Unknown run"}), 404
+    return jsonify(run.snapshot())
+
 # --- CLEAR ALL MOVIES ---
 @app.route("/clear_movies", methods=["POST"])
 def clear_movies():
     with closing(get_db()) as conn:
         c = conn.cursor()
         c.execute("DELETE FROM movies")
+        c.execute("DELETE FROM identify_jobs")
         conn.commit()
     return redirect("/catalogue")
 
+# === MAINTENANCE ===
+def run_maintenance(vacuum=True):
+    # purge rows left behind by deletes, then report (and optionally reclaim) free pages
+    report = {}
+    with closing(get_db()) as conn:
+        c = conn.cursor()
+        page_size = c.execute("PRAGMA page_size").fetchone()[0]
+        report["pages_before"] = c.execute("PRAGMA page_count").fetchone()[0]
+        report["free_pages_before"] = c.execute("PRAGMA freelist_count").fetchone()[0]
+        report["orphan_movie_collections"] = c.execute("""
+            DELETE FROM movie_collections
+            WHERE movie_rowid NOT IN (SELECT rowid FROM movies)
+               OR collection_id NOT IN (SELECT id FROM collections)
+        """).rowcount
+        report["orphan_identify_jobs"] = c.execute(
+            "DELETE FROM identify_jobs WHERE movie_rowid NOT IN (SELECT rowid FROM movies)"
+        ).rowcount
+        report["foreign_key_violations"] = len(c.execute("PRAGMA foreign_key_check").fetchall())
+        conn.commit()
+        if FTS_ENABLED:
+            c.execute("INSERT INTO movies_fts(movies_fts) VALUES ('optimize')")
+            conn.commit()
+        c.execute("PRAGMA optimize")
+        if vacuum:
+            c.execute("VACUUM")
+            c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        report["pages_after"] = c.execute("PRAGMA page_count").fetchone()[0]
+        report["free_pages_after"] = c.execute("PRAGMA freelist_count").fetchone()[0]
+    report["dead_bytes_before"] = report["free_pages_before"] * page_size
+    report["bytes_before"] = report["pages_before"] * page_size
+    report["bytes_after"] = report["pages_after"] * page_size
+    # the FTS optimize can grow the file when nothing is vacuumed; growth isn't reclaimed space
+    report["reclaimed_bytes"] = max(0, report["bytes_before"] - report["bytes_after"])
+    return report
+
+@app.cli.command("db-maintenance")
+@click.option("--vacuum/--no-vacuum", default=True, help="Rewrite the database file to reclaim free pages.")
+def db_maintenance_command(vacuum):
+    """Purge orphaned rows, report dead space and optionally VACUUM."""
+    for key, value in run_maintenance(vacuum).items():
+        click.echo(f"{key}: {value}")
+
+@app.cli.command("poster-prefetch")
+@click.option("--size", default=None, help="Also cache this TMDb size (e.g. w92) instead of the stored one.")
+@click.option("--workers", default=4, show_default=True, help="Concurrent downloads.")
+def poster_prefetch_command(size, workers):
+    """Download every catalogue poster into the local poster cache."""
+    urls = catalogue_poster_urls(size)
+    click.echo(f"{len(urls)} posters")
+    def progress(done, total):
+        if done % 50 == 0 or done == total:
+            click.echo(f"fetched {done}/{total}")
+    for key, value in poster_cache.prefetch(urls, workers, progress).items():
+        click.echo(f"{key}: {value}")
+
+@app.cli.command("reidentify")
+@click.option("--rowid", "rowids", type=int, multiple=True, help="Row to re-identify (repeatable).")
+@click.option("--missing-tmdb", is_flag=True, help="Rows without a tmdb_id.")
+@click.option("--missing-poster", is_flag=True, help="Rows without a poster.")
+@click.option("--status", default=None, help="Only rows with this status.")
+@click.option("--format", "format_", default=None, help="Only rows with this format.")
+@click.option("--all", "all_rows", is_flag=True, help="Every row in the catalogue.")
+def reidentify_command(rowids, missing_tmdb, missing_poster, status, format_, all_rows):
+    """Re-resolve existing rows against TMDb and refresh titles, posters, tmdb_ids and collections."""
+    if not identification_available():
+        raise click.ClickException("TMDb API key is not set and the local title index is empty")
+    filters = {k: v for k, v in (("missing_tmdb", missing_tmdb), ("missing_poster", missing_poster),
+                                 ("status", status), ("format", format_), ("all", all_rows)) if v}
+    rows, error = reidentify_rows({"rowids": list(rowids), "filter": filters})
+    if error:
+        raise click.UsageError(error)
+    click.echo(f"{len(rows)} rows")
+    last = [0.0]
+    def progress(run):
+        if time.monotonic() - last[0] >= 2 or run.processed == run.total:
+            last[0] = time.monotonic()
+            snap = run.snapshot()
+            click.echo(f"{snap['processed']}/{snap['total']} rows, {snap['rows_per_sec']} rows/s")
+    try:
+        run = reidentify.run_now(rows, resolve_tmdb, reidentify_collection_lookup(), progress)
+    except reidentify.Busy as e:
+        raise click.ClickException(f"re-identify run {e} is already in progress")
+    for key, value in run.snapshot().items():
+        click.echo(f"{key}: {value}")
+
+@app.cli.command("title-index-load")
+@click.argument("path", required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option("--from-cache", is_flag=True, help="Also load every movie from cached TMDb search responses.")
+@click.option("--include-adult", is_flag=True, help="Keep entries flagged adult.")
+def title_index_load_command(path, from_cache, include_adult):
+    """Load TMDb titles (daily ID export or JSON lines, optionally .gz) into the local title index."""
+    if not path and not from_cache:
+        raise click.UsageError("Give a file to load and/or --from-cache")
+    def progress(counts):
+        if counts["loaded"] % 100000 == 0:
+            click.echo(f"loaded {counts['loaded']} titles")
+    for label, items in (("file", title_index.read_file(path) if path else None),
+                         ("cache", tmdb_cache.search_results() if from_cache else None)):
+        if items is None:
+            continue
+        counts = title_index.load(items, include_adult, progress)
+        click.echo(f"{label}: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+    click.echo(f"titles: {title_index.stats()['titles']}")
+
 # === RUN APP ===
 if __name__ == "__main__":
     app.run(debug=DEBUG)
@@ -0,0 +1,107 @@
+# bench_db_pool.py
+# Compare request throughput with a fresh rollback-journal connection per call ("baseline")
+# against pooled WAL connections ("pooled") under concurrent /api/search and /add load.
+#
+#   python benchmarks/bench_db_pool.py --rows 20000 --threads 8 --requests 2000
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "baseline": {"DB_POOL_SIZE": 0, "DB_WAL": False},
+    "pooled": {"DB_POOL_SIZE": 8, "DB_WAL": True},
+}
+
+
+def run_worker(mode, rows, threads, requests):
+    sys.path.insert(0, APP_DIR)
+    import config
+    tmpdir = tempfile.mkdtemp(prefix="bench_db_")
+    config.DB_PATH = os.path.join(tmpdir, "movies.db")
+    config.TMDB_API_KEY = "YOUR_TMDB_API_KEY_HERE"
+    config.BACKGROUND_IDENTIFY = False
+    for k, v in MODES[mode].items():
+        setattr(config, k, v)
+
+    import app as app_module
+    from werkzeug.serving import make_server
+
+    conn = app_module.get_db()
+    conn.executemany(
+        "INSERT INTO movies (title, year, format, status) VALUES (?, ?, ?, ?)",
+        [(f"Movie {i}", str(1950 + i % 70), ("DVD", "Blu-ray", "4K")[i % 3], ("owned", "wanted")[i % 2])
+         for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    base = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def one(i):
+        if i % 10 == 0:
+            body = json.dumps({"title": f"Bench {i}", "year": "2001"}).encode()
+            req = urllib.request.Request(base + "/add", data=body, headers={"Content-Type": "application/json"})
+        else:
+            req = urllib.request.Request(base + f"/api/search?status=&sort=alpha&page={i % 20 + 1}&q=movie%20{i % 50}")
+        started = time.perf_counter()
+        with urllib.request.urlopen(req) as r:
+            r.read()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = sorted(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    print(json.dumps({
+        "mode": mode,
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "req_per_sec": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite connection pooling benchmark")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--worker", choices=sorted(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.rows, args.threads, args.requests)
+        return
+
+    # each mode runs in its own process so module-level config is applied from scratch
+    results = []
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", mode, "--rows", str(args.rows),
+             "--threads", str(args.threads), "--requests", str(args.requests)],
+            cwd=APP_DIR, capture_output=True, text=True, check=True
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['req_per_sec']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}")
+    if results[0]["req_per_sec"]:
+        print(f"speedup: {results[1]['req_per_sec'] / results[0]['req_per_sec']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# bench_routes.py
+# Per-route latency baseline against synthetic catalogues (see synth_catalogue.py) with TMDb replaced by a
+# local fake server. Every (catalogue size, route) pair runs in its own process on a fresh copy of the
+# database, so peak RSS is per route. Prints a table and writes the results as JSON for later comparison.
+#
+#   python benchmarks/bench_routes.py --rows 10000,100000 --threads 8 --out baseline.json
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import synth_catalogue
+
+# === CONFIG VARIABLES ===
+# rows per generated CSV upload, and rows touched per bulk request
+IMPORT_ROWS = 1000
+BULK_ROWS = 200
+QUERIES = ("night", "dark city", "return of the king", "ghost", "summer storm", "legend", "iron", "blue moon")
+SORTS = ("alpha", "year_desc", "year_asc", "recent")
+STATUSES = ("", "", "owned", "wanted")
+
+# name -> requests per run when --requests isn't given
+ROUTES = {
+    "search": 2000,
+    "facets": 500,
+    "export_csv": 20,
+    "import_csv": 40,
+    "update_bulk": 400,
+    "add_bulk_collections": 400,
+}
+
+
+# --- Fake TMDb ---
+class FakeTMDb(BaseHTTPRequestHandler):
+    # answers search/movie and movie/<id> with deterministic data after a configurable delay
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        if url.path == "/3/search/movie":
+            query = params.get("query", [""])[0]
+            year = params.get("year", ["2000"])[0]
+            tmdb_id = int(uuid.uuid5(uuid.NAMESPACE_OID, query.lower()).int % 10 ** 7) + 10 ** 7
+            body = {"results": [{"id": tmdb_id, "title": query.title(), "release_date": f"{year}-01-01",
+                                 "poster_path": f"/fake{tmdb_id}.jpg"}]}
+        elif url.path.startswith("/3/movie/"):
+            tmdb_id = int(url.path.rsplit("/", 1)[1])
+            collection = {"id": tmdb_id % 50, "name": f"Fake Saga {tmdb_id % 50}"} if tmdb_id % 3 == 0 else None
+            body = {"id": tmdb_id, "belongs_to_collection": collection}
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_tmdb(latency_ms):
+    FakeTMDb.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTMDb)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Request builders ---
+def _multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: text/csv\r\n\r\n'.encode() + content + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _import_csv_body(rng, columns):
+    rows = [",".join(columns)]
+    for _ in range(IMPORT_ROWS):
+        movie = synth_catalogue._movie(rng, 0)
+        # no tmdb_id, so imported rows go through the (fake) identify queue like a real import
+        values = dict(zip(columns, movie), tmdb_id=None, poster_path=None)
+        rows.append(",".join("" if values[c] is None else f'"{values[c]}"' for c in columns))
+    return ("\r\n".join(rows) + "\r\n").encode()
+
+
+def build_request(route, i, rng, ctx):
+    base = ctx["base"]
+    json_headers = {"Content-Type": "application/json"}
+    if route == "search":
+        params = {"q": rng.choice(QUERIES) if i % 3 else "", "sort": rng.choice(SORTS),
+                  "status": rng.choice(STATUSES), "page": rng.randint(1, 20)}
+        return urllib.request.Request(f"{base}/api/search?{urllib.parse.urlencode(params)}")
+    if route == "facets":
+        params = {"q": rng.choice(QUERIES) if i % 3 else "", "status": rng.choice(STATUSES)}
+        return urllib.request.Request(f"{base}/api/facets?{urllib.parse.urlencode(params)}")
+    if route == "export_csv":
+        return urllib.request.Request(f"{base}/export_csv")
+    if route == "import_csv":
+        body, content_type = _multipart({"on_duplicate": "skip"},
+                                        {"csv_file": ("bench.csv", _import_csv_body(rng, ctx["columns"]))})
+        return urllib.request.Request(f"{base}/import_csv", data=body, headers={
+            "Content-Type": content_type, "X-Requested-With": "XMLHttpRequest"})
+    rowids = rng.sample(range(1, ctx["max_rowid"] + 1), min(BULK_ROWS, ctx["max_rowid"]))
+    if route == "update_bulk":
+        body = {"rowids": rowids, "fields": {"status": rng.choice(("owned", "wanted"))}}
+        return urllib.request.Request(f"{base}/update_bulk", data=json.dumps(body).encode(), headers=json_headers)
+    if route == "add_bulk_collections":
+        body = {"rowids": rowids, "collections": [f"Bench Collection {rng.randint(1, 20)}"]}
+        return urllib.request.Request(f"{base}/add_bulk_collections", data=json.dumps(body).encode(),
+                                      headers=json_headers)
+    raise ValueError(f"unknown route {route}")
+
+
+def percentile(sorted_values, p):
+    # nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# --- Worker ---
+def run_worker(route, db_file, threads, requests, tmdb_latency_ms, response_cache, seed):
+    sys.path.insert(0, APP_DIR)
+    import config
+    tmpdir = tempfile.mkdtemp(prefix="bench_routes_")
+    db_path = os.path.join(tmpdir, "movies.db")
+    shutil.copyfile(db_file, db_path)
+    tmdb = start_fake_tmdb(tmdb_latency_ms)
+    config.DB_PATH = db_path
+    config.TMDB_API_KEY = "bench"
+    config.TMDB_BASE_URL = f"http://127.0.0.1:{tmdb.server_port}/3/"
+    config.TMDB_RATE_LIMIT = 10000
+    config.TMDB_RATE_BURST = 10000
+    config.POSTER_CACHE_DIR = os.path.join(tmpdir, "poster_cache")
+    if not response_cache:
+        config.RESPONSE_CACHE_SIZE = 0
+
+    import app as app_module
+    from werkzeug.serving import make_server
+    # an unknown sort silently falls back to "recent" and would go unmeasured
+    unknown = set(SORTS) - set(app_module.SORT_KEYS)
+    if unknown:
+        raise SystemExit(f"unknown sort(s) in SORTS: {', '.join(sorted(unknown))}")
+
+    conn = sqlite3.connect(db_path)
+    ctx = {"max_rowid": conn.execute("SELECT MAX(rowid) FROM movies").fetchone()[0] or 1,
+           "columns": app_module.EXPORT_COLUMNS}
+    conn.close()
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    ctx["base"] = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    rss_before = _peak_rss_mb()
+
+    errors = []
+    # request bodies are built up front so generating them isn't timed
+    rng = random.Random(seed)
+    prepared = [build_request(route, i, rng, ctx) for i in range(requests)]
+
+    def one(req):
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as r:
+                r.read()
+        except (urllib.error.URLError, OSError) as e:
+            errors.append(str(e))
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = sorted(pool.map(one, prepared))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    tmdb.shutdown()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    print(json.dumps({
+        "route": route,
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": round(elapsed, 3),
+        "req_per_sec": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "rss_start_mb": rss_before,
+        "peak_rss_mb": _peak_rss_mb(),
+    }), flush=True)
+    # skip interpreter shutdown; identify workers may still be draining imported rows
+    os._exit(0)
+
+
+# --- Driver ---
+def ensure_catalogue(rows, collections, density, seed):
+    # generated catalogues are kept under benchmarks/data and reused for the same parameters
+    path = synth_catalogue.default_path(rows, collections, density, seed)
+    if not os.path.exists(path):
+        print(f"generating {rows} rows -> {path}", file=sys.stderr)
+        subprocess.run([sys.executable, synth_catalogue.__file__, "--rows", str(rows), "--collections",
+                        str(collections), "--density", str(density), "--seed", str(seed), "--out", path],
+                       cwd=APP_DIR, check=True, stdout=subprocess.DEVNULL)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-route latency, throughput and memory baseline")
+    parser.add_argument("--rows", default="10000,100000", help="comma-separated catalogue sizes")
+    parser.add_argument("--collections", type=int, default=200)
+    parser.add_argument("--density", type=float, default=0.5, help="average collections per movie")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="comma-separated subset of routes")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, help="requests per route (default: per-route)")
+    parser.add_argument("--tmdb-latency-ms", type=float, default=20, help="delay added by the fake TMDb")
+    parser.add_argument("--no-response-cache", action="store_true", help="measure uncached API responses")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--worker", choices=sorted(ROUTES), help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.db, args.threads, args.requests or ROUTES[args.worker],
+                   args.tmdb_latency_ms, not args.no_response_cache, args.seed)
+        return
+
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = [r for r in routes if r not in ROUTES]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)} (choose from {', '.join(ROUTES)})")
+    sizes = [int(n) for n in args.rows.split(",") if n.strip()]
+
+    results = []
+    for rows in sizes:
+        db_file = ensure_catalogue(rows, args.collections, args.density, args.seed)
+        for route in routes:
+            cmd = [sys.executable, os.path.abspath(__file__), "--worker", route, "--db", db_file,
+                   "--threads", str(args.threads), "--tmdb-latency-ms", str(args.tmdb_latency_ms),
+                   "--seed", str(args.seed)]
+            if args.requests:
+                cmd += ["--requests", str(args.requests)]
+            if args.no_response_cache:
+                cmd.append("--no-response-cache")
+            out = subprocess.run(cmd, cwd=APP_DIR, capture_output=True, text=True, check=True)
+            result = json.loads([line for line in out.stdout.splitlines() if line.startswith("{")][-1])
+            result["rows"] = rows
+            results.append(result)
+            print(f"{rows:>9} {route:<22}{result['req_per_sec']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                  f"{result['p99_ms']:>9}{result['peak_rss_mb']:>9}{result['errors']:>7}", file=sys.stderr)
+
+    print(f"{'rows':>9} {'route':<22}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'RSS MB':>9}{'errors':>7}")
+    for r in results:
+        print(f"{r['rows']:>9} {r['route']:<22}{r['req_per_sec']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+              f"{r['p99_ms']:>9}{r['peak_rss_mb']:>9}{r['errors']:>7}")
+
+    if args.out:
+        baseline = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "settings": {"threads": args.threads, "collections": args.collections, "density": args.density,
+                         "tmdb_latency_ms": args.tmdb_latency_ms, "response_cache": not args.no_response_cache,
+                         "seed": args.seed},
+            "results": results,
+        }
+        with open(args.out, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
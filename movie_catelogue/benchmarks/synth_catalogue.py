@@ -0,0 +1,110 @@
+# synth_catalogue.py
+# Build a synthetic movies.db for benchmarks. The schema (indexes, FTS table, triggers) comes from the app
+# itself, so the file behaves like a real catalogue; content is seeded so the same arguments give the same DB.
+#
+#   python benchmarks/synth_catalogue.py --rows 100000 --collections 500 --density 0.5 --out /tmp/movies_100k.db
+import argparse
+import os
+import random
+import sys
+import time
+from contextlib import closing
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# === CONFIG VARIABLES ===
+BATCH_SIZE = 5000
+WORDS = ("night", "day", "return", "last", "first", "dark", "light", "city", "river", "king", "queen", "war",
+         "love", "ghost", "star", "lost", "secret", "empire", "summer", "winter", "blood", "iron", "glass",
+         "shadow", "island", "train", "house", "garden", "storm", "fire", "ice", "moon", "sun", "road", "heart",
+         "dream", "machine", "stranger", "legend", "ocean", "mountain", "silent", "wild", "golden",
+         "black", "white", "red", "blue", "little", "big", "long", "hidden", "broken", "final", "brave")
+FORMATS = ("DVD", "Blu-ray", "4K", "VHS", "Digital")
+STATUSES = ("owned", "owned", "owned", "owned", "wanted")
+COUNTRIES = ("US", "GB", "FR", "DE", "JP", "KR", "IT", "ES", "CA", "AU")
+LANGUAGES = ("en", "en", "en", "fr", "de", "ja", "ko", "it", "es")
+VERSIONS = ("Director's Cut", "Extended", "Theatrical", "Remastered", "Collector's Edition")
+
+
+def default_path(rows, collections, density, seed=0):
+    return os.path.join(APP_DIR, "benchmarks", "data", f"movies_{rows}_{collections}_{density:g}_{seed}.db")
+
+
+def _movie(rng, i):
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+    if rng.random() < 0.15:
+        title += f" {rng.randint(2, 6)}"
+    year = str(rng.randint(1920, 2025)) if rng.random() < 0.97 else None
+    # most rows look identified; tmdb ids are unique like real ones
+    tmdb_id = 1000 + i if rng.random() < 0.6 else None
+    poster = f"https://image.tmdb.org/t/p/w200/synth{tmdb_id}.jpg" if tmdb_id else None
+    barcode = f"{rng.randrange(10 ** 12, 10 ** 13)}" if rng.random() < 0.7 else None
+    notes = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40))) if rng.random() < 0.2 else None
+    return (barcode, title, year, rng.choice(FORMATS), poster, tmdb_id, rng.choice(STATUSES),
+            rng.choice(VERSIONS) if rng.random() < 0.1 else None, rng.choice(COUNTRIES), rng.choice(LANGUAGES),
+            rng.choice(("A", "B", "1", "2", None)), rng.choice((1, 1, 1, 2, 3)), notes)
+
+
+def _memberships(rng, rowid, collections, density):
+    # density = average number of collections per movie; the fractional part is a probability
+    n = int(density) + (rng.random() < density - int(density))
+    return [(rowid, cid) for cid in rng.sample(range(1, collections + 1), min(n, collections))]
+
+
+def generate(path, rows, collections=200, density=0.5, seed=0, progress=None):
+    # must run in a fresh process: the app binds its database path at import time
+    for stale in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    sys.path.insert(0, APP_DIR)
+    import config
+    config.DB_PATH = path
+    config.TMDB_API_KEY = "YOUR_TMDB_API_KEY_HERE"
+    config.BACKGROUND_IDENTIFY = False
+    import app as app_module
+
+    rng = random.Random(seed)
+    with closing(app_module.get_db()) as conn:
+        conn.executemany("INSERT INTO collections (id, name) VALUES (?, ?)",
+                         [(i, f"{rng.choice(WORDS).title()} Collection {i}") for i in range(1, collections + 1)])
+        for start in range(0, rows, BATCH_SIZE):
+            batch = [_movie(rng, i) for i in range(start, min(start + BATCH_SIZE, rows))]
+            conn.executemany(f"""
+                INSERT INTO movies (rowid, {", ".join(app_module.EXPORT_COLUMNS)})
+                VALUES (?, {", ".join("?" * len(app_module.EXPORT_COLUMNS))})
+            """, [(start + n + 1, *movie) for n, movie in enumerate(batch)])
+            if collections and density:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO movie_collections (movie_rowid, collection_id) VALUES (?, ?)",
+                    [m for n in range(len(batch)) for m in _memberships(rng, start + n + 1, collections, density)])
+            conn.commit()
+            if progress:
+                progress(min(start + BATCH_SIZE, rows), rows)
+        conn.execute("ANALYZE")
+        conn.commit()
+        # fold the WAL back in so the file can be copied on its own
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic movie catalogue")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--collections", type=int, default=200)
+    parser.add_argument("--density", type=float, default=0.5, help="average collections per movie")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="database file (default: benchmarks/data/movies_<params>.db)")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.out or default_path(args.rows, args.collections, args.density, args.seed))
+    started = time.perf_counter()
+    generate(path, args.rows, args.collections, args.density, args.seed,
+             progress=lambda done, total: print(f"\r{done}/{total} rows", end="", file=sys.stderr, flush=True))
+    print(file=sys.stderr)
+    print(f"{path} ({args.rows} rows, {time.perf_counter() - started:.1f}s)", file=sys.stderr)
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
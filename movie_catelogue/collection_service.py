@@ -0,0 +1,91 @@
+# collection_service.py
+# Set-based collection helpers. Callers own the connection and the transaction;
+# sqlite3 errors propagate so routes can roll back and report them.
+
+
+def parse_names(value):
+    # accepts a list or a comma-separated string; drops blanks and case-insensitive repeats
+    if not value:
+        return []
+    items = value if isinstance(value, list) else str(value).split(',')
+    names = []
+    seen = set()
+    for item in items:
+        name = str(item).strip()
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def ensure_collections(conn, names):
+    # create any missing names in one statement, then return [(id, name)] in input order
+    if not names:
+        return []
+    values = ", ".join(["(?)"] * len(names))
+    conn.execute(f"""
+        WITH wanted(name) AS (VALUES {values})
+        INSERT INTO collections (name)
+        SELECT name FROM wanted
+        WHERE NOT EXISTS (SELECT 1 FROM collections c WHERE c.name = wanted.name COLLATE NOCASE)
+    """, names)
+    placeholders = ", ".join(["?"] * len(names))
+    rows = conn.execute(f"""
+        SELECT MIN(id), name FROM collections
+        WHERE name COLLATE NOCASE IN ({placeholders})
+        GROUP BY name COLLATE NOCASE
+    """, names).fetchall()
+    by_name = {r[1].lower(): (r[0], r[1]) for r in rows}
+    return [by_name[n.lower()] for n in names if n.lower() in by_name]
+
+
+def _load_rowids(conn, rowids):
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS batch_rowids (id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.batch_rowids")
+    conn.executemany("INSERT OR IGNORE INTO temp.batch_rowids (id) VALUES (?)", [(r,) for r in rowids])
+
+
+def add_to_collections(conn, rowids, coll_ids):
+    # one INSERT ... SELECT for every (movie, collection) pair; returns the number of new associations
+    if not rowids or not coll_ids:
+        return 0
+    _load_rowids(conn, rowids)
+    placeholders = ", ".join(["?"] * len(coll_ids))
+    c = conn.execute(f"""
+        INSERT OR IGNORE INTO movie_collections (movie_rowid, collection_id)
+        SELECT m.rowid, c.id
+        FROM temp.batch_rowids r
+        JOIN movies m ON m.rowid = r.id
+        CROSS JOIN collections c
+        WHERE c.id IN ({placeholders})
+    """, list(coll_ids))
+    return c.rowcount
+
+
+def set_movie_collections(conn, rowid, names):
+    # replace a movie's memberships with exactly these names (an empty list clears them)
+    colls = ensure_collections(conn, names)
+    conn.execute("DELETE FROM movie_collections WHERE movie_rowid = ?", (rowid,))
+    conn.executemany(
+        "INSERT OR IGNORE INTO movie_collections (movie_rowid, collection_id) VALUES (?, ?)",
+        [(rowid, cid) for cid, _ in colls]
+    )
+    return colls
+
+
+def memberships(conn, rowids):
+    # {rowid: [collection names]} for every requested rowid, from a single join
+    result = {r: [] for r in rowids}
+    if not rowids:
+        return result
+    _load_rowids(conn, rowids)
+    rows = conn.execute("""
+        SELECT mc.movie_rowid, c.name
+        FROM temp.batch_rowids r
+        JOIN movie_collections mc ON mc.movie_rowid = r.id
+        JOIN collections c ON c.id = mc.collection_id
+        ORDER BY mc.movie_rowid, c.name COLLATE NOCASE
+    """).fetchall()
+    for movie_rowid, name in rows:
+        result[movie_rowid].append(name)
+    return result
@@ -30,4 +30,57 @@ DEBUG = True
 
 # Automatically add movies to TMDb collections
 AUTO_ADD_COLLECTIONS = True
- 
\ No newline at end of file
+
+# TMDb response cache (in-memory LRU size; per-endpoint TTLs in seconds)
+TMDB_CACHE_SIZE = 1024
+TMDB_CACHE_TTL = {"search": 7 * 24 * 3600, "movie": 30 * 24 * 3600}
+TMDB_CACHE_NEGATIVE_TTL = 3600  # empty search results are retried after an hour
+
+# Background identification of added/imported movies
+BACKGROUND_IDENTIFY = True
+IDENTIFY_WORKERS = 4
+IDENTIFY_MAX_ATTEMPTS = 5
+
+# TMDb HTTP client: shared rate limit (requests per second, burst) and (connect, read) timeouts
+TMDB_RATE_LIMIT = 20
+TMDB_RATE_BURST = 20
+TMDB_TIMEOUT = (3.05, 10)
+
+# Use the SQLite FTS5 full-text index for search (falls back to LIKE if unavailable)
+SEARCH_USE_FTS = True
+
+# SQLite connections: idle pool size (0 disables reuse), WAL journaling and tuning pragmas
+DB_POOL_SIZE = 8
+DB_WAL = True
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHE_SIZE_KB = 20000
+DB_MMAP_SIZE = 256 * 1024 * 1024
+
+# CSV import: rows per batch and what to do with rows whose barcode/tmdb_id already exist
+# ("skip", "update" or "duplicate")
+IMPORT_BATCH_SIZE = 500
+IMPORT_DUPLICATE_MODE = "skip"
+
+# Local poster cache: directory and size limit (least recently used posters are evicted first)
+POSTER_CACHE_DIR = "poster_cache"
+POSTER_CACHE_MAX_MB = 200
+
+# Rendered /api/search responses kept in memory (dropped whenever the catalogue changes)
+RESPONSE_CACHE_SIZE = 256
+
+# Bulk re-identification: concurrent TMDb lookups and rows written per transaction
+REIDENTIFY_WORKERS = 4
+REIDENTIFY_BATCH_SIZE = 100
+
+# Instrumentation: /metrics (Prometheus format), SQL statements slower than this are sampled at
+# /api/slow_queries, and requests slower than SLOW_REQUEST_MS are printed (0 = off).
+# METRICS_SQL_TRACE also counts every statement SQLite runs, at a cost on bulk writes.
+METRICS_ENABLED = True
+METRICS_SLOW_QUERY_MS = 100
+METRICS_SQL_TRACE = False
+SLOW_REQUEST_MS = 0
+
+# Local TMDb title index (load it with `flask --app app title-index-load`); matches scoring at least
+# TITLE_INDEX_MIN_SCORE (0-1) are used without calling the API
+TITLE_INDEX_ENABLED = True
+TITLE_INDEX_MIN_SCORE = 0.9
@@ -0,0 +1,118 @@
+# db.py
+import queue
+import sqlite3
+import time
+
+import config
+import metrics
+
+# === CONFIG VARIABLES ===
+DB_PATH = config.DB_PATH
+# idle connections kept for reuse; 0 opens a fresh connection every time
+POOL_SIZE = getattr(config, 'DB_POOL_SIZE', 8)
+WAL = getattr(config, 'DB_WAL', True)
+BUSY_TIMEOUT_MS = getattr(config, 'DB_BUSY_TIMEOUT_MS', 5000)
+CACHE_SIZE_KB = getattr(config, 'DB_CACHE_SIZE_KB', 20000)
+MMAP_SIZE = getattr(config, 'DB_MMAP_SIZE', 256 * 1024 * 1024)
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE) if POOL_SIZE > 0 else None
+
+
+class TimedCursor(sqlite3.Cursor):
+    # feeds metrics.observe_sql; only the time to the first row is measured
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_sql(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_sql(sql, time.perf_counter() - started)
+
+
+class PooledConnection(sqlite3.Connection):
+    # connections held for a whole Flask request ignore close() until teardown
+    request_scoped = False
+
+    def close(self):
+        if self.request_scoped:
+            if self.in_transaction:
+                self.rollback()
+            return
+        release(self)
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = TimedCursor if metrics.ENABLED else sqlite3.Cursor
+        return super().cursor(factory)
+
+    # the C implementations of these bypass cursor(); route them through it so they're timed too
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def really_close(self):
+        metrics.inc('sqlite_connections_closed_total')
+        sqlite3.Connection.close(self)
+
+
+def open_connection(path=DB_PATH):
+    # pooled connections move between threads, but only one thread uses each at a time
+    conn = sqlite3.connect(path, factory=PooledConnection, check_same_thread=False,
+                           timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    metrics.inc('sqlite_connections_opened_total')
+    if metrics.ENABLED:
+        conn.set_progress_handler(metrics.sql_progress, metrics.PROGRESS_STEPS)
+        if metrics.SQL_TRACE:
+            conn.set_trace_callback(metrics.sql_trace)
+    # only connections to the main database go back into the pool
+    conn.pooled = path == DB_PATH
+    if WAL:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA cache_size=-{int(CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(MMAP_SIZE)}")
+    return conn
+
+
+def acquire():
+    if _pool is not None:
+        try:
+            conn = _pool.get_nowait()
+            metrics.inc('sqlite_pool_acquires_total', result='reused')
+            return conn
+        except queue.Empty:
+            pass
+    metrics.inc('sqlite_pool_acquires_total', result='opened')
+    return open_connection()
+
+
+def release(conn):
+    # uncommitted work is discarded, exactly as a real close would
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        conn.really_close()
+        return
+    if _pool is None or not conn.pooled:
+        conn.really_close()
+        return
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.really_close()
+
+
+def pool_stats():
+    return {"idle": _pool.qsize() if _pool is not None else 0, "capacity": POOL_SIZE}
@@ -0,0 +1,199 @@
+# identify_queue.py
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import config
+import db
+import metrics
+
+# === CONFIG VARIABLES ===
+WORKERS = getattr(config, 'IDENTIFY_WORKERS', 4)
+MAX_ATTEMPTS = getattr(config, 'IDENTIFY_MAX_ATTEMPTS', 5)
+# seconds before the first retry; doubled on every further failure
+RETRY_DELAY = getattr(config, 'IDENTIFY_RETRY_DELAY', 30)
+POLL_INTERVAL = 2.0
+
+STATES = ('pending', 'running', 'done', 'no_match', 'failed')
+
+_wake = threading.Event()
+_start_lock = threading.Lock()
+_started = False
+
+
+def _connect():
+    return db.acquire()
+
+
+def init_queue():
+    with closing(_connect()) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS identify_jobs (
+                movie_rowid INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                year TEXT,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                batch TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_identify_due ON identify_jobs(state, next_attempt_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_identify_batch ON identify_jobs(batch, state)")
+        conn.commit()
+
+
+def new_batch():
+    return uuid.uuid4().hex[:12]
+
+
+def enqueue(conn, jobs, batch=None):
+    # jobs: iterable of (rowid, title, year); the caller owns the transaction
+    now = time.time()
+    conn.executemany("""
+        INSERT OR REPLACE INTO identify_jobs
+            (movie_rowid, title, year, state, attempts, last_error, batch, created_at, updated_at, next_attempt_at)
+        VALUES (?, ?, ?, 'pending', 0, NULL, ?, ?, ?, ?)
+    """, [(rowid, title, year, batch, now, now, now) for rowid, title, year in jobs])
+
+
+def enqueue_select(conn, select_sql, params=(), batch=None):
+    # set-based variant of enqueue: select_sql yields (rowid, title, year) for the rows to identify
+    now = time.time()
+    c = conn.execute(f"""
+        INSERT OR REPLACE INTO identify_jobs
+            (movie_rowid, title, year, state, attempts, last_error, batch, created_at, updated_at, next_attempt_at)
+        SELECT q.*, 'pending', 0, NULL, ?, ?, ?, ? FROM ({select_sql}) q
+    """, (batch, now, now, now, *params))
+    return c.rowcount
+
+
+def notify():
+    _wake.set()
+
+
+def _claim(limit):
+    now = time.time()
+    claimed = []
+    with closing(_connect()) as conn:
+        rows = conn.execute("""
+            SELECT movie_rowid, title, year, attempts FROM identify_jobs
+            WHERE state = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at LIMIT ?
+        """, (now, limit)).fetchall()
+        for r in rows:
+            # conditional update so two processes never run the same job
+            c = conn.execute(
+                "UPDATE identify_jobs SET state = 'running', updated_at = ? WHERE movie_rowid = ? AND state = 'pending'",
+                (now, r['movie_rowid'])
+            )
+            if c.rowcount:
+                claimed.append(dict(r))
+        conn.commit()
+    return claimed
+
+
+def _finish(job, state, error=None, retry_at=None):
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute("""
+            UPDATE identify_jobs
+            SET state = ?, attempts = ?, last_error = ?, updated_at = ?, next_attempt_at = ?
+            WHERE movie_rowid = ? AND state = 'running'
+        """, (state, job['attempts'], error, now, retry_at or now, job['movie_rowid']))
+        conn.commit()
+
+
+def _run_job(job, resolve):
+    # rate limiting happens in tmdb_client, so cache hits are not throttled
+    try:
+        match = resolve(job['title'], job['year'])
+    except Exception as e:
+        job['attempts'] += 1
+        if job['attempts'] >= MAX_ATTEMPTS:
+            _finish(job, 'failed', str(e))
+        else:
+            delay = RETRY_DELAY * 2 ** (job['attempts'] - 1)
+            _finish(job, 'pending', str(e), time.time() + delay)
+        return
+    if not match or not match[0]:
+        _finish(job, 'no_match')
+        return
+    title, year, poster_path, tmdb_id = match
+    with closing(_connect()) as conn:
+        # skip rows whose title was edited since the job was queued
+        conn.execute("""
+            UPDATE movies SET title = ?, year = ?, poster_path = ?, tmdb_id = ?
+            WHERE rowid = ? AND title = ?
+        """, (title, year, poster_path, tmdb_id, job['movie_rowid'], job['title']))
+        conn.commit()
+    _finish(job, 'done')
+
+
+def _loop(resolve):
+    with ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='identify') as pool:
+        while True:
+            try:
+                jobs = _claim(WORKERS * 4)
+                if not jobs:
+                    _wake.wait(POLL_INTERVAL)
+                    _wake.clear()
+                    continue
+                list(pool.map(lambda job: _run_job(job, resolve), jobs))
+            except Exception as e:
+                print("Identify queue error:", e)
+                metrics.inc('app_errors_total', source='identify_queue')
+                time.sleep(POLL_INTERVAL)
+
+
+def start(resolve):
+    # resolve(title, year) -> (title, year, poster_path, tmdb_id) or None; raises to retry. Returns whether the
+    # dispatcher is running; a failed start can be retried, so call this outside any open write transaction
+    global _started
+    with _start_lock:
+        if _started:
+            return True
+        try:
+            with closing(_connect()) as conn:
+                # jobs interrupted by a restart go back in the queue
+                conn.execute("UPDATE identify_jobs SET state = 'pending' WHERE state = 'running'")
+                conn.commit()
+        except sqlite3.Error as e:
+            print("Identify queue start error:", e)
+            metrics.inc('app_errors_total', source='identify_queue')
+            return False
+        threading.Thread(target=_loop, args=(resolve,), name='identify-dispatcher', daemon=True).start()
+        _started = True
+    return True
+
+
+def status(batch=None):
+    with closing(_connect()) as conn:
+        if batch:
+            rows = conn.execute(
+                "SELECT state, COUNT(*) FROM identify_jobs WHERE batch = ? GROUP BY state", (batch,)
+            ).fetchall()
+        else:
+            rows = conn.execute("SELECT state, COUNT(*) FROM identify_jobs GROUP BY state").fetchall()
+    counts = {s: 0 for s in STATES}
+    counts.update({r[0]: r[1] for r in rows})
+    total = sum(counts.values())
+    finished = counts['done'] + counts['no_match'] + counts['failed']
+    return {
+        "batch": batch,
+        "total": total,
+        "finished": finished,
+        "progress": round(finished / total, 4) if total else 1.0,
+        "states": counts,
+    }
+
+
+def job_state(conn, rowid):
+    row = conn.execute("SELECT state FROM identify_jobs WHERE movie_rowid = ?", (rowid,)).fetchone()
+    return row[0] if row else None
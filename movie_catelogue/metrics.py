@@ -0,0 +1,204 @@
+# metrics.py
+# In-process counters and latency histograms for HTTP requests, SQL statements and TMDb calls, rendered in
+# the Prometheus text format for /metrics. Statements slower than SLOW_QUERY_MS are also kept as samples
+# with their SQL text. Other modules' own statistics are added at scrape time through register().
+import threading
+import time
+from collections import deque
+
+import config
+
+# === CONFIG VARIABLES ===
+ENABLED = getattr(config, 'METRICS_ENABLED', True)
+SLOW_QUERY_MS = getattr(config, 'METRICS_SLOW_QUERY_MS', 100)
+SLOW_QUERY_SAMPLES = 50
+# the trace hook costs a Python call per statement, trigger bodies included (noticeable on bulk writes)
+SQL_TRACE = getattr(config, 'METRICS_SQL_TRACE', False)
+# the progress hook fires once per this many SQLite VM instructions
+PROGRESS_STEPS = 1000
+# histogram bucket bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# statement kinds used as the SQL histogram label; anything else counts as OTHER
+SQL_KINDS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH', 'CREATE', 'DROP', 'PRAGMA', 'BEGIN',
+             'COMMIT', 'ROLLBACK')
+
+HELP = {
+    'http_requests_total': ('counter', 'HTTP requests by endpoint, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Time to build a response (streamed bodies excluded)'),
+    'http_request_exceptions_total': ('counter', 'Requests that ended in an unhandled exception'),
+    'sqlite_query_duration_seconds': ('histogram', 'Time to execute a statement up to its first row'),
+    'sqlite_statements_total': ('counter', 'Statements run by SQLite, including those inside triggers'),
+    'sqlite_vm_steps_total': ('counter', 'SQLite virtual machine instructions executed (approximate)'),
+    'sqlite_slow_queries_total': ('counter', f'Statements slower than {SLOW_QUERY_MS} ms'),
+    'sqlite_connections_opened_total': ('counter', 'SQLite connections opened'),
+    'sqlite_connections_closed_total': ('counter', 'SQLite connections closed'),
+    'sqlite_pool_acquires_total': ('counter', 'Connections handed out, by whether the pool had one idle'),
+    'tmdb_request_duration_seconds': ('histogram', 'TMDb HTTP round trips by endpoint'),
+    'tmdb_requests_total': ('counter', 'TMDb HTTP responses by endpoint and outcome'),
+    'title_index_lookups_total': ('counter', 'Local title index lookups by whether they skipped the API'),
+    'app_errors_total': ('counter', 'Errors handled and logged by the app, by source'),
+}
+
+_lock = threading.Lock()
+# (name, labels) -> value / [per-bucket counts..., +Inf count, sum]
+_counters = {}
+_histograms = {}
+_slow_queries = deque(maxlen=SLOW_QUERY_SAMPLES)
+_collectors = []
+# SQL work done by the current thread since begin_request()
+_local = threading.local()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, n=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                h[i] += 1
+                break
+        else:
+            h[len(BUCKETS)] += 1
+        h[-1] += seconds
+
+
+def register(collector):
+    # collector() -> [(name, type, help, labels, value)], called on every scrape
+    _collectors.append(collector)
+
+
+# --- SQL ---
+def begin_request():
+    _local.request = {'statements': 0, 'seconds': 0.0, 'vm_steps': 0}
+
+
+def request_sql():
+    # {'statements', 'seconds', 'vm_steps'} for this thread since begin_request(); statements stay 0
+    # unless SQL_TRACE is on
+    return dict(getattr(_local, 'request', None) or {'statements': 0, 'seconds': 0.0, 'vm_steps': 0})
+
+
+def _pending():
+    # per-thread counts not yet added to the shared counters; the hooks below run inside SQLite and
+    # must not take the lock
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = {'statements': 0, 'vm_steps': 0}
+    return pending
+
+
+def _note(name, n):
+    _pending()[name] += n
+    request = getattr(_local, 'request', None)
+    if request is not None:
+        request[name] += n
+
+
+def sql_trace(statement):
+    # sqlite3 trace callback
+    _note('statements', 1)
+
+
+def sql_progress():
+    # sqlite3 progress handler; returning 0 lets the statement continue
+    _note('vm_steps', PROGRESS_STEPS)
+    return 0
+
+
+def observe_sql(sql, seconds):
+    words = sql.split(None, 1)
+    kind = words[0].upper() if words else 'OTHER'
+    observe('sqlite_query_duration_seconds', seconds, statement=kind if kind in SQL_KINDS else 'OTHER')
+    request = getattr(_local, 'request', None)
+    if request is not None:
+        request['seconds'] += seconds
+    pending = _pending()
+    for name in ('statements', 'vm_steps'):
+        if pending[name]:
+            inc(f'sqlite_{name}_total', pending[name])
+            pending[name] = 0
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        inc('sqlite_slow_queries_total')
+        with _lock:
+            _slow_queries.append({"sql": " ".join(sql.split())[:1000], "ms": round(seconds * 1000, 2),
+                                  "at": round(time.time(), 3), "thread": threading.current_thread().name})
+
+
+def slow_queries():
+    with _lock:
+        return list(reversed(_slow_queries))
+
+
+# --- Rendering ---
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(int(value))
+
+
+def render():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+    families = {}
+    for (name, labels), value in counters.items():
+        families.setdefault(name, []).append((labels, value))
+    for collector in _collectors:
+        try:
+            samples = collector()
+        except Exception as e:
+            print("Metrics collector error:", e)
+            continue
+        for name, kind, text, labels, value in samples:
+            HELP.setdefault(name, (kind, text))
+            families.setdefault(name, []).append((tuple(sorted(labels.items())), value))
+
+    lines = []
+    for name in sorted(families):
+        kind, text = HELP.get(name, ('untyped', name))
+        lines += [f'# HELP {name} {text}', f'# TYPE {name} {kind}']
+        for labels, value in sorted(families[name], key=lambda s: s[0]):
+            lines.append(f'{name}{_labels(labels)} {_number(value)}')
+    by_name = {}
+    for (name, labels), h in histograms.items():
+        by_name.setdefault(name, []).append((labels, h))
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, ('histogram', name))
+        lines += [f'# HELP {name} {text}', f'# TYPE {name} histogram']
+        for labels, h in sorted(by_name[name], key=lambda s: s[0]):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+            cumulative += h[len(BUCKETS)]
+            lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(h[-1])}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,233 @@
+# poster_cache.py
+# On-disk poster cache. Image bytes are stored once per SHA-256 under CACHE_DIR/<sha[:2]>/<sha>;
+# the poster_cache table maps each source URL to its blob and tracks last access for LRU eviction.
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+import db
+import metrics
+
+# === CONFIG VARIABLES ===
+CACHE_DIR = getattr(config, 'POSTER_CACHE_DIR', 'poster_cache')
+MAX_BYTES = int(getattr(config, 'POSTER_CACHE_MAX_MB', 200) * 1024 * 1024)
+# only these hosts are fetched and cached; any other poster URL is redirected to as before
+ALLOWED_HOSTS = set(getattr(config, 'POSTER_ALLOWED_HOSTS', ('image.tmdb.org',)))
+TIMEOUT = getattr(config, 'TMDB_TIMEOUT', (3.05, 10))
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+# TMDb image sizes a client may ask for with ?size=
+SIZES = ('w92', 'w154', 'w185', 'w200', 'w300', 'w342', 'w500', 'w780', 'original')
+# last_access is only rewritten when it is older than this, so cache hits rarely write
+TOUCH_INTERVAL = 60
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=8))
+
+_locks_guard = threading.Lock()
+_url_locks = {}
+_evict_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'fetch_errors': 0, 'evicted': 0}
+
+_TMDB_SIZE_RE = re.compile(r"/t/p/[^/]+/")
+
+
+def _connect():
+    return db.acquire()
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def init_cache():
+    with closing(_connect()) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS poster_cache (
+                url TEXT PRIMARY KEY,
+                sha TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                content_type TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_poster_cache_access ON poster_cache(last_access)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_poster_cache_sha ON poster_cache(sha)")
+        conn.commit()
+
+
+def is_cacheable(url):
+    parsed = urlparse(url or '')
+    return parsed.scheme in ('http', 'https') and parsed.hostname in ALLOWED_HOSTS
+
+
+def sized_url(url, size=None):
+    # swap the size segment of a TMDb image URL (".../t/p/w200/x.jpg" -> ".../t/p/w92/x.jpg")
+    if not size or size not in SIZES or not is_cacheable(url):
+        return url
+    return _TMDB_SIZE_RE.sub(f"/t/p/{size}/", url, count=1)
+
+
+def _blob_path(sha):
+    return os.path.join(CACHE_DIR, sha[:2], sha)
+
+
+def lookup(url):
+    # cached entry for url, or None; a row whose blob has gone missing counts as a miss
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT sha, content_type, last_access FROM poster_cache WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        path = _blob_path(row["sha"])
+        if not os.path.exists(path):
+            conn.execute("DELETE FROM poster_cache WHERE url = ?", (url,))
+            conn.commit()
+            return None
+        now = time.time()
+        if now - row["last_access"] > TOUCH_INTERVAL:
+            conn.execute("UPDATE poster_cache SET last_access = ? WHERE url = ?", (now, url))
+            conn.commit()
+    return {"path": path, "sha": row["sha"], "content_type": row["content_type"]}
+
+
+def _store(url, content, content_type):
+    sha = hashlib.sha256(content).hexdigest()
+    path = _blob_path(sha)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temp file first so readers never see a partial image
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO poster_cache (url, sha, size, content_type, fetched_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (url, sha, len(content), content_type, now, now))
+        conn.commit()
+    return {"path": path, "sha": sha, "content_type": content_type}
+
+
+def _fetch(url):
+    r = _session.get(url, timeout=TIMEOUT)
+    r.raise_for_status()
+    content_type = r.headers.get("Content-Type", "").split(";")[0].strip()
+    if not content_type.startswith("image/"):
+        raise ValueError(f"not an image ({content_type or 'no content type'})")
+    if len(r.content) > MAX_IMAGE_BYTES:
+        raise ValueError("image too large")
+    return r.content, content_type
+
+
+def _url_lock(url):
+    with _locks_guard:
+        return _url_locks.setdefault(url, threading.Lock())
+
+
+def get(url):
+    # serve from disk, downloading on a miss; None when the image can't be fetched (e.g. offline)
+    entry = lookup(url)
+    if entry:
+        _count('hits')
+        return entry
+    lock = _url_lock(url)
+    # concurrent requests for the same poster wait for a single download
+    with lock:
+        try:
+            entry = lookup(url)
+            if entry:
+                _count('hits')
+                return entry
+            _count('misses')
+            try:
+                content, content_type = _fetch(url)
+            except (requests.RequestException, ValueError) as e:
+                _count('fetch_errors')
+                print("Poster fetch error:", url, e)
+                metrics.inc('app_errors_total', source='poster_fetch')
+                return None
+            entry = _store(url, content, content_type)
+        finally:
+            with _locks_guard:
+                _url_locks.pop(url, None)
+    evict()
+    return entry
+
+
+def evict(max_bytes=None):
+    # drop least recently used URLs until the blobs on disk fit in max_bytes
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    removed = 0
+    with _evict_lock, closing(_connect()) as conn:
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM poster_cache GROUP BY sha)"
+        ).fetchone()[0]
+        while total > max_bytes:
+            victims = conn.execute(
+                "SELECT url, sha, size FROM poster_cache ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if not victims:
+                break
+            for v in victims:
+                conn.execute("DELETE FROM poster_cache WHERE url = ?", (v["url"],))
+                removed += 1
+                # the blob may still back another URL
+                if conn.execute("SELECT 1 FROM poster_cache WHERE sha = ?", (v["sha"],)).fetchone():
+                    continue
+                try:
+                    os.remove(_blob_path(v["sha"]))
+                except OSError:
+                    pass
+                total -= v["size"]
+                if total <= max_bytes:
+                    break
+            conn.commit()
+    if removed:
+        _count('evicted', removed)
+    return removed
+
+
+def prefetch(urls, workers=4, progress=None):
+    # warm the cache for every URL not already on disk; returns {"cached", "fetched", "failed"}
+    counts = {"cached": 0, "fetched": 0, "failed": 0}
+    todo = []
+    for url in dict.fromkeys(u for u in urls if is_cacheable(u)):
+        if lookup(url):
+            counts["cached"] += 1
+        else:
+            todo.append(url)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for done, entry in enumerate(pool.map(get, todo), 1):
+            counts["fetched" if entry else "failed"] += 1
+            if progress:
+                progress(done, len(todo))
+    return counts
+
+
+def stats():
+    with closing(_connect()) as conn:
+        row = conn.execute("""
+            SELECT COUNT(*) AS urls, COUNT(DISTINCT sha) AS blobs,
+                   COALESCE((SELECT SUM(size) FROM (SELECT MAX(size) AS size FROM poster_cache GROUP BY sha)), 0) AS bytes
+            FROM poster_cache
+        """).fetchone()
+    with _stats_lock:
+        out = dict(_stats)
+    out.update({"urls": row["urls"], "blobs": row["blobs"], "bytes": row["bytes"], "max_bytes": MAX_BYTES})
+    return out
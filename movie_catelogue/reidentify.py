@@ -0,0 +1,207 @@
+# reidentify.py
+# Bulk re-identification of existing rows. Rows are grouped by normalized (title, year) so each distinct
+# query hits TMDb once; lookups run on a bounded worker pool while a single writer applies the results
+# in batched transactions. Runs are tracked in memory for progress reporting.
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+
+import config
+import db
+import metrics
+import collection_service
+
+# === CONFIG VARIABLES ===
+WORKERS = getattr(config, 'REIDENTIFY_WORKERS', 4)
+BATCH_SIZE = getattr(config, 'REIDENTIFY_BATCH_SIZE', 100)
+# finished runs kept for status lookups
+KEEP_RUNS = 20
+
+FILTERS = ('missing_tmdb', 'missing_poster', 'status', 'format', 'all')
+
+_runs = OrderedDict()
+_runs_lock = threading.Lock()
+
+
+class Busy(Exception):
+    pass
+
+
+class Run:
+    def __init__(self, total):
+        self.id = uuid.uuid4().hex[:12]
+        self.state = 'running'
+        self.total = total
+        self.queries = 0
+        self.processed = 0
+        self.updated = 0
+        self.no_match = 0
+        self.failed = 0
+        self.collections_added = 0
+        self.last_error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def count(self, **deltas):
+        with self._lock:
+            for name, n in deltas.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            return {
+                "run": self.id,
+                "state": self.state,
+                "total": self.total,
+                "queries": self.queries,
+                "processed": self.processed,
+                "updated": self.updated,
+                "no_match": self.no_match,
+                "failed": self.failed,
+                "collections_added": self.collections_added,
+                "last_error": self.last_error,
+                "progress": round(self.processed / self.total, 4) if self.total else 1.0,
+                "elapsed": round(elapsed, 2),
+                "rows_per_sec": round(self.processed / elapsed, 1) if elapsed > 0 else 0.0,
+            }
+
+
+def select_rows(conn, rowids=None, filters=None):
+    # -> [(rowid, title, year)] for explicit rowids, or for the rows matching filters (see FILTERS)
+    if rowids:
+        collection_service._load_rowids(conn, rowids)
+        rows = conn.execute("""
+            SELECT m.rowid, m.title, m.year FROM temp.batch_rowids r JOIN movies m ON m.rowid = r.id
+            ORDER BY m.rowid
+        """).fetchall()
+        return [tuple(r) for r in rows]
+    filters = filters or {}
+    where = []
+    params = []
+    if filters.get('missing_tmdb'):
+        where.append("tmdb_id IS NULL")
+    if filters.get('missing_poster'):
+        where.append("(poster_path IS NULL OR poster_path = '')")
+    if filters.get('status'):
+        where.append("status = ?")
+        params.append(filters['status'])
+    if filters.get('format'):
+        where.append("format = ?")
+        params.append(filters['format'])
+    if not where and not filters.get('all'):
+        # never re-identify the whole catalogue by accident
+        return []
+    where_sql = "WHERE " + " AND ".join(where) if where else ""
+    rows = conn.execute(f"SELECT rowid, title, year FROM movies {where_sql} ORDER BY rowid", params).fetchall()
+    return [tuple(r) for r in rows]
+
+
+def _query_key(title, year):
+    return ' '.join(str(title or '').lower().split()), str(year or '').strip()[:4]
+
+
+def _write(run, results):
+    # results: [(rowid, old_title, match, collection)]; one transaction per batch
+    with closing(db.acquire()) as conn:
+        c = conn.executemany("""
+            UPDATE movies SET title = ?, year = ?, poster_path = ?, tmdb_id = ?
+            WHERE rowid = ? AND title = ?
+        """, [(*match, rowid, old_title) for rowid, old_title, match, _ in results])
+        updated = c.rowcount
+        by_collection = {}
+        for rowid, _, _, collection in results:
+            if collection and collection.get("name"):
+                by_collection.setdefault(collection["name"], []).append(rowid)
+        added = 0
+        for name, rowids in by_collection.items():
+            coll_ids = [cid for cid, _ in collection_service.ensure_collections(conn, [name])]
+            added += collection_service.add_to_collections(conn, rowids, coll_ids)
+        conn.commit()
+    run.count(updated=updated, collections_added=added)
+
+
+def execute(run, rows, resolve, collection_for=None, progress=None):
+    # resolve(title, year) -> (title, year, poster_path, tmdb_id) or None, raising on lookup errors;
+    # collection_for(tmdb_id) -> {"name": ...} or None
+    groups = OrderedDict()
+    for rowid, title, year in rows:
+        groups.setdefault(_query_key(title, year), []).append((rowid, title, year))
+    run.count(queries=len(groups))
+
+    def lookup(members):
+        _, title, year = members[0]
+        match = resolve(title, year or None)
+        collection = collection_for(match[3]) if match and match[3] and collection_for else None
+        return match, collection
+
+    pending = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, WORKERS), thread_name_prefix='reidentify') as pool:
+            futures = {pool.submit(lookup, members): members for members in groups.values()}
+            for future in as_completed(futures):
+                members = futures[future]
+                try:
+                    match, collection = future.result()
+                except Exception as e:
+                    run.last_error = str(e)
+                    run.count(failed=len(members), processed=len(members))
+                    continue
+                if not match or not match[0]:
+                    run.count(no_match=len(members), processed=len(members))
+                else:
+                    pending.extend((rowid, title, match, collection) for rowid, title, _ in members)
+                    run.count(processed=len(members))
+                if len(pending) >= BATCH_SIZE:
+                    _write(run, pending)
+                    pending = []
+                if progress:
+                    progress(run)
+        if pending:
+            _write(run, pending)
+        run.state = 'done'
+    except Exception as e:
+        run.last_error = str(e)
+        run.state = 'failed'
+        print("Re-identify error:", e)
+        metrics.inc('app_errors_total', source='reidentify')
+    run.finished_at = time.time()
+    return run
+
+
+def _register(total):
+    with _runs_lock:
+        active = [r for r in _runs.values() if r.state == 'running']
+        if active:
+            raise Busy(active[0].id)
+        run = Run(total)
+        _runs[run.id] = run
+        while len(_runs) > KEEP_RUNS:
+            _runs.popitem(last=False)
+    return run
+
+
+def start(rows, resolve, collection_for=None):
+    # run in a background thread; only one run at a time (raises Busy with the active run's id)
+    run = _register(len(rows))
+    threading.Thread(target=execute, args=(run, rows, resolve, collection_for),
+                     name=f'reidentify-{run.id}', daemon=True).start()
+    return run
+
+
+def run_now(rows, resolve, collection_for=None, progress=None):
+    return execute(_register(len(rows)), rows, resolve, collection_for, progress)
+
+
+def get(run_id):
+    with _runs_lock:
+        return _runs.get(run_id)
+
+
+def recent():
+    with _runs_lock:
+        return [r.snapshot() for r in reversed(_runs.values())]
@@ -0,0 +1,101 @@
+# response_cache.py
+# In-process cache of rendered API responses. Entries are keyed on (name, version, request key), where
+# version is a data_versions counter bumped by triggers; storing a newer version drops that name's older
+# entries, so writers never need to know which responses they affect.
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# === CONFIG VARIABLES ===
+CACHE_SIZE = getattr(config, 'RESPONSE_CACHE_SIZE', 256)
+# bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+
+_lru = OrderedDict()
+_versions = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+
+class Entry:
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self._encoded = {None: body}
+
+    def encoded(self, encoding):
+        # compressed variants are built on first use and kept with the entry
+        if encoding not in self._encoded:
+            if encoding == 'br':
+                self._encoded[encoding] = brotli.compress(self.body)
+            else:
+                self._encoded[encoding] = gzip.compress(self.body, GZIP_LEVEL)
+        return self._encoded[encoding]
+
+    def etag_for(self, encoding):
+        # strong validators must differ between encodings of the same body
+        return f"{self.etag}-{encoding}" if encoding else self.etag
+
+
+def choose_encoding(accept_encodings, size):
+    # accept_encodings is werkzeug's request.accept_encodings
+    if size < MIN_COMPRESS_BYTES:
+        return None
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def get(name, version, key):
+    with _lock:
+        entry = _lru.get((name, version, key))
+        if entry is None:
+            _stats['misses'] += 1
+            return None
+        _lru.move_to_end((name, version, key))
+        _stats['hits'] += 1
+        return entry
+
+
+def put(name, version, key, body, mimetype):
+    entry = Entry(body, mimetype)
+    with _lock:
+        current = _versions.get(name)
+        if current is not None and version < current:
+            # rendered from data that has already changed again; don't keep it
+            return entry
+        if version != current:
+            _versions[name] = version
+            for k in [k for k in _lru if k[0] == name and k[1] != version]:
+                del _lru[k]
+        _lru[(name, version, key)] = entry
+        _lru.move_to_end((name, version, key))
+        while len(_lru) > CACHE_SIZE:
+            _lru.popitem(last=False)
+    return entry
+
+
+def note_not_modified():
+    with _lock:
+        _stats['not_modified'] += 1
+
+
+def stats():
+    with _lock:
+        out = dict(_stats)
+        out['entries'] = len(_lru)
+    out['size'] = CACHE_SIZE
+    out['brotli'] = brotli is not None
+    return out
@@ -0,0 +1,97 @@
+// search_client.js
+// Query layer for /api/search: aborts superseded requests, keeps an LRU of recent pages keyed by the
+// request URL (query, sort, filters and page) and prefetches the next page while the browser is idle.
+
+const CACHE_SIZE = 30;
+// cached pages are reused for this long unless something invalidates them first
+const MAX_AGE_MS = 60000;
+
+// url -> { promise, time }; Map iteration order doubles as LRU order
+const _pages = new Map();
+let _controller = null;
+
+export function searchUrl({ page = 1, query = "", sort, status = "", letter = "", formats = [], pageSize = null, fields = "", include = "collections" }) {
+    // include=collections embeds memberships so the edit modal needs no extra request
+    let url = `/api/search?page=${page}&sort=${sort}&status=${status}`;
+    if (include) url += `&include=${encodeURIComponent(include)}`;
+    if (fields) url += `&fields=${encodeURIComponent(fields)}`;
+    if (pageSize !== null && typeof pageSize !== 'undefined') url += `&page_size=${encodeURIComponent(pageSize)}`;
+    if (query) url += `&q=${encodeURIComponent(query)}`;
+    if (letter) url += `&starts_with=${encodeURIComponent(letter)}`;
+    if (formats && formats.length) url += `&formats=${encodeURIComponent(formats.join(","))}`;
+    return url;
+}
+
+// grouped filter counts for the same query and filters (page, sort and page size don't matter)
+export function facetsUrl({ query = "", status = "", letter = "", formats = [] }) {
+    const params = new URLSearchParams();
+    if (status) params.set('status', status);
+    if (query) params.set('q', query);
+    if (letter) params.set('starts_with', letter);
+    if (formats && formats.length) params.set('formats', formats.join(","));
+    return `/api/facets?${params.toString()}`;
+}
+
+function _remember(url, entry) {
+    _pages.delete(url);
+    _pages.set(url, entry);
+    while (_pages.size > CACHE_SIZE) _pages.delete(_pages.keys().next().value);
+}
+
+function _cached(url) {
+    const hit = _pages.get(url);
+    if (!hit) return null;
+    if (Date.now() - hit.time > MAX_AGE_MS) {
+        _pages.delete(url);
+        return null;
+    }
+    _remember(url, hit);
+    return hit.promise;
+}
+
+function _request(url, signal) {
+    const promise = fetch(url, { signal }).then(res => {
+        if (!res.ok) throw new Error(`search failed (${res.status})`);
+        return res.json();
+    });
+    _remember(url, { promise, time: Date.now() });
+    // failed or aborted requests must not be served from the cache
+    promise.catch(() => {
+        if (_pages.get(url)?.promise === promise) _pages.delete(url);
+    });
+    return promise;
+}
+
+// Abort the request currently feeding the grid (e.g. the user kept typing)
+export function cancelPending() {
+    if (_controller) _controller.abort();
+    _controller = null;
+}
+
+// Page for display. Starting another fetchPage aborts this one, whose promise then rejects with an AbortError.
+export function fetchPage(url) {
+    cancelPending();
+    const cached = _cached(url);
+    if (cached) return cached;
+    _controller = new AbortController();
+    return _request(url, _controller.signal);
+}
+
+// Page from the cache or a new request that later calls can't abort (used for background loads)
+export function fetchCached(url) {
+    return _cached(url) || _request(url);
+}
+
+// Warm the cache for a page the user is likely to open next; never aborted, and shared with fetchPage
+export function prefetch(url) {
+    if (_pages.has(url)) return;
+    const idle = window.requestIdleCallback || (fn => setTimeout(fn, 200));
+    idle(() => {
+        if (!_cached(url)) _request(url).catch(() => {});
+    });
+}
+
+// Call after anything that changes the catalogue
+export function invalidateSearchCache() {
+    _pages.clear();
+}
@@ -0,0 +1,140 @@
+// virtual_grid.js
+// Page size "all" shows the whole result set as one scrolling grid. Only the rows in view (plus BUFFER_ROWS
+// above and below) are in the DOM; padding stands in for the rest, and movies are fetched CHUNK_SIZE at a
+// time as their rows come into range. Rows have a fixed height so a scroll offset maps straight to a row.
+import { fetchCached, prefetch } from './search_client.js';
+
+export const CHUNK_SIZE = 200;
+export const BUFFER_ROWS = 3;
+// loaded chunks kept around; the ones furthest from the viewport are dropped first
+const MAX_CHUNKS = 8;
+const GRID_GAP = 20;
+
+// rows (and movie indexes) to render for a scroll position; pure so it can be checked without a browser
+export function windowRange({ scrolled, viewport, pitch, cols, total, buffer = BUFFER_ROWS }) {
+    const totalRows = Math.ceil(total / cols);
+    const firstRow = Math.max(0, Math.min(totalRows, Math.floor(scrolled / pitch) - buffer));
+    const lastRow = Math.max(firstRow, Math.min(totalRows, Math.ceil((scrolled + viewport) / pitch) + buffer));
+    return { firstRow, lastRow, totalRows, start: firstRow * cols, end: Math.min(total, lastRow * cols) };
+}
+
+// grid: the .poster-grid element; renderCard(movie) -> element; chunkUrl(params, chunk) -> /api/search URL;
+// infoSelector: the part of a card below the poster, measured to size the rows
+export function createVirtualGrid({ grid, renderCard, chunkUrl, infoSelector }) {
+    const v = { params: null, total: 0, chunks: new Map(), pending: new Set(), cards: new Map(), range: null,
+                frame: 0, force: false, bound: false };
+
+    function metrics() {
+        // resolved track list, e.g. "212px 212px 212px"
+        const tracks = getComputedStyle(grid).gridTemplateColumns.split(' ').filter(Boolean);
+        const cols = Math.max(1, tracks.length);
+        const trackWidth = parseFloat(tracks[0]) || 180;
+        const info = grid.querySelector(`.poster-card:not(.placeholder) ${infoSelector}`);
+        return { cols, rowHeight: Math.ceil(trackWidth * 1.5) + (info ? info.offsetHeight : 0) };
+    }
+
+    function schedule(force = false) {
+        if (!v.params) return;
+        v.force = v.force || force;
+        if (v.frame) return;
+        v.frame = requestAnimationFrame(() => {
+            v.frame = 0;
+            const f = v.force;
+            v.force = false;
+            render(f);
+        });
+    }
+
+    function render(force = false) {
+        if (!v.params) return;
+        const { cols, rowHeight } = metrics();
+        const pitch = rowHeight + GRID_GAP;
+        // pixels of the grid scrolled above the viewport
+        const scrolled = -grid.getBoundingClientRect().top;
+        const { firstRow, lastRow, totalRows, start, end } = windowRange({ scrolled, viewport: window.innerHeight, pitch, cols, total: v.total });
+        if (!force && v.range && v.range.start === start && v.range.end === end && v.range.rowHeight === rowHeight) return;
+        v.range = { start, end, rowHeight };
+
+        grid.style.setProperty('--virtual-row-height', `${rowHeight}px`);
+        grid.style.paddingTop = `${firstRow * pitch}px`;
+        grid.style.paddingBottom = `${(totalRows - lastRow) * pitch}px`;
+
+        // cards still in range are moved, not rebuilt, so a half-typed edit survives scrolling and chunk loads
+        const cards = new Map();
+        const nodes = [];
+        const missing = new Set();
+        for (let i = start; i < end; i++) {
+            const chunk = Math.floor(i / CHUNK_SIZE);
+            const m = v.chunks.get(chunk)?.[i - chunk * CHUNK_SIZE];
+            if (m) {
+                const card = v.cards.get(m.rowid) || renderCard(m);
+                cards.set(m.rowid, card);
+                nodes.push(card);
+            } else {
+                missing.add(chunk);
+                const placeholder = document.createElement("div");
+                placeholder.className = "poster-card placeholder";
+                nodes.push(placeholder);
+            }
+        }
+        v.cards = cards;
+        grid.replaceChildren(...nodes);
+        // the first real cards may reveal an info height the estimate didn't include
+        if (metrics().rowHeight !== rowHeight) schedule(true);
+
+        missing.forEach(loadChunk);
+        // the chunk after the window is likely next
+        const nextChunk = Math.floor(end / CHUNK_SIZE) + 1;
+        if (end < v.total && nextChunk * CHUNK_SIZE < v.total) prefetch(chunkUrl(v.params, nextChunk));
+        evict(start, end);
+    }
+
+    async function loadChunk(chunk) {
+        if (v.pending.has(chunk)) return;
+        const params = v.params;
+        const pending = v.pending;
+        pending.add(chunk);
+        try {
+            const data = await fetchCached(chunkUrl(params, chunk));
+            if (v.params !== params) return;
+            v.chunks.set(chunk, data.movies);
+            schedule(true);
+        } catch (err) {
+            console.error('grid chunk error', err);
+        } finally {
+            pending.delete(chunk);
+        }
+    }
+
+    function evict(start, end) {
+        if (v.chunks.size <= MAX_CHUNKS) return;
+        const centre = (start + end) / 2 / CHUNK_SIZE;
+        const byDistance = [...v.chunks.keys()].sort((a, b) => Math.abs(b - centre) - Math.abs(a - centre));
+        for (const chunk of byDistance.slice(0, v.chunks.size - MAX_CHUNKS)) v.chunks.delete(chunk);
+    }
+
+    return {
+        // first: the already-fetched chunk 0 response for these params
+        show(params, first) {
+            const sameQuery = v.params && JSON.stringify(v.params) === JSON.stringify(params);
+            Object.assign(v, { params, total: first.total, chunks: new Map([[0, first.movies]]), pending: new Set(),
+                               cards: new Map(), range: null });
+            grid.classList.add('virtual');
+            if (!v.bound) {
+                v.bound = true;
+                window.addEventListener('scroll', () => schedule(), { passive: true });
+                window.addEventListener('resize', () => schedule(true));
+            }
+            // a new query starts at the top; a reload of the same one (e.g. after an edit) keeps its place
+            if (!sameQuery && grid.getBoundingClientRect().top < 0) grid.scrollIntoView();
+            render(true);
+        },
+        leave() {
+            if (!v.params) return;
+            Object.assign(v, { params: null, chunks: new Map(), cards: new Map() });
+            grid.classList.remove('virtual');
+            grid.style.paddingTop = '';
+            grid.style.paddingBottom = '';
+        },
+    };
+}
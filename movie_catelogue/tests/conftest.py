@@ -0,0 +1,26 @@
+# conftest.py
+# The app binds its database path when it is imported, so every test shares one throwaway catalogue that is
+# configured here before the first import.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    import config
+    data = tmp_path_factory.mktemp("catalogue")
+    config.DB_PATH = str(data / "movies.db")
+    config.POSTER_CACHE_DIR = str(data / "poster_cache")
+    config.TMDB_API_KEY = "YOUR_TMDB_API_KEY_HERE"
+    config.BACKGROUND_IDENTIFY = False
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,65 @@
+# test_add_form.py
+# The add form posts form-encoded fields with its Scan box ticked (scan=1); the page script sends
+# X-Requested-With and renders the scan result, a plain submit gets a redirect.
+from contextlib import closing
+
+XHR = {"X-Requested-With": "XMLHttpRequest"}
+
+
+def rows_with_barcode(app, barcode):
+    with closing(app.get_db()) as conn:
+        return conn.execute("SELECT rowid, status FROM movies WHERE barcode = ?", (barcode,)).fetchall()
+
+
+def test_rescanning_a_barcode_adds_it_once(app_module, client):
+    form = {"barcode": "999", "title": "Scan Twice", "year": "", "format": "DVD", "status": "owned", "scan": "1"}
+    first = client.post("/add", data=form, headers=XHR).get_json()
+    second = client.post("/add", data=form, headers=XHR).get_json()
+    assert first["scan_result"] == "added"
+    assert second["scan_result"] == "owned"
+    assert second["rowid"] == first["rowid"]
+    assert len(rows_with_barcode(app_module, "999")) == 1
+
+
+def test_plain_form_rescan_redirects_without_adding(app_module, client):
+    form = {"barcode": "998", "title": "Scan Plain", "format": "DVD", "status": "owned", "scan": "1"}
+    assert client.post("/add", data=form).status_code == 302
+    assert client.post("/add", data=form).status_code == 302
+    assert len(rows_with_barcode(app_module, "998")) == 1
+
+
+def test_scan_promotes_wanted_to_owned(app_module, client):
+    client.post("/add", data={"barcode": "997", "title": "Scan Wanted", "status": "wanted"}, headers=XHR)
+    result = client.post("/add", data={"barcode": "997", "scan": "1"}, headers=XHR).get_json()
+    assert result["scan_result"] == "promoted"
+    assert [r["status"] for r in rows_with_barcode(app_module, "997")] == ["owned"]
+
+
+def test_unknown_barcode_without_title_asks_for_one(app_module, client):
+    result = client.post("/add", data={"barcode": "996", "title": "", "scan": "1"}, headers=XHR).get_json()
+    assert result["scan_result"] == "new"
+    assert rows_with_barcode(app_module, "996") == []
+
+
+def test_scan_box_without_barcode_is_an_ordinary_add(client):
+    result = client.post("/add", data={"barcode": "", "title": "Scan No Barcode", "scan": "1"}, headers=XHR)
+    assert result.status_code == 200
+    assert result.get_json()["title"] == "Scan No Barcode"
+
+
+def test_unticked_scan_box_adds_another_copy(app_module, client):
+    form = {"barcode": "995", "title": "Second Copy", "format": "DVD", "status": "owned"}
+    client.post("/add", data={**form, "scan": "1"}, headers=XHR)
+    copy = client.post("/add", data=form, headers=XHR).get_json()
+    assert copy["duplicate_of"] is not None
+    assert len(rows_with_barcode(app_module, "995")) == 2
+
+
+def test_background_add_can_be_polled(app_module, client, monkeypatch):
+    # the page polls /api/identify_status?rowid= while identify_state is "pending"
+    monkeypatch.setattr(app_module, "background_identify_enabled", lambda: True)
+    form = {"title": "Poll Me", "year": "2001", "format": "DVD", "status": "owned"}
+    data = client.post("/add", data=form, headers=XHR).get_json()
+    assert data["identify_state"] == "pending"
+    status = client.get(f"/api/identify_status?rowid={data['rowid']}").get_json()
+    assert status == {"rowid": data["rowid"], "state": "pending"}
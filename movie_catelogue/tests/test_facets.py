@@ -0,0 +1,44 @@
+# test_facets.py
+# /api/facets: grouped counts under the grid's filters, and a plan that can't fall back to probing the FTS
+# table once per movie.
+from contextlib import closing
+
+from werkzeug.datastructures import MultiDict
+
+
+def add_movies(app, rows):
+    with closing(app.get_db()) as conn:
+        conn.executemany("INSERT INTO movies (title, year, format, status) VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+
+
+def counts(facet):
+    return {f["value"]: f["count"] for f in facet}
+
+
+def test_status_and_format_ignore_their_own_filter(app_module, client):
+    add_movies(app_module, [
+        ("Facetzz One", "1994", "DVD", "owned"),
+        ("Facetzz Two", "1995", "Blu-ray", "owned"),
+        ("Facetzz Three", "2003", "DVD", "wanted"),
+    ])
+    data = client.get("/api/facets?q=facetzz&status=owned&formats=DVD").get_json()
+    assert data["total"] == 1
+    facets = data["facets"]
+    # status counts keep the format filter, format counts keep the status filter
+    assert counts(facets["status"]) == {"owned": 1, "wanted": 1}
+    assert counts(facets["format"]) == {"DVD": 1, "Blu-ray": 1}
+    assert counts(facets["decade"]) == {1990: 1}
+
+
+def test_fts_counts_are_driven_by_the_match(app_module):
+    join_sql, join_params, conditions = app_module.search_conditions(MultiDict({"q": "night", "status": "owned"}))
+    where_sql = "WHERE " + " AND ".join(clause for _, clause, _ in conditions)
+    params = [*join_params, *(v for _, _, p in conditions for v in p)]
+    with closing(app_module.get_db()) as conn:
+        plan = [r[3] for r in conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT status, format, COUNT(*) FROM movies {join_sql} {where_sql} GROUP BY status, format",
+            params).fetchall()]
+    # the match is the outer loop and movies are looked up by rowid, never one FTS query per movie
+    assert plan[0].startswith("SCAN movies_fts"), plan
+    assert sum("movies_fts" in step for step in plan) == 1, plan
@@ -0,0 +1,49 @@
+# test_import_csv.py
+# The catalogue page uploads CSVs with X-Requested-With and renders the JSON report it gets back.
+import io
+from contextlib import closing
+
+XHR = {"X-Requested-With": "XMLHttpRequest"}
+
+
+def upload(client, text, **form):
+    data = {"csv_file": (io.BytesIO(text.encode("utf-8")), "movies.csv"), **form}
+    return client.post("/import_csv", data=data, headers=XHR, content_type="multipart/form-data")
+
+
+def test_xhr_import_reports_rejected_lines(client):
+    resp = upload(client, "title,year,tmdb_id,barcode\r\n"
+                          "Import Good,1999,,5550001\r\n"
+                          ",2000,,\r\n"
+                          "Import Bad Id,2001,abc,\r\n")
+    assert resp.status_code == 200
+    report = resp.get_json()
+    assert report["inserted"] == 1
+    assert report["rejected"] == 2
+    assert [r["line"] for r in report["rejected_rows"]] == [3, 4]
+
+
+def test_xhr_import_skips_known_barcodes(client):
+    upload(client, "title,barcode\r\nImport Twice,5550002\r\n")
+    report = upload(client, "title,barcode\r\nImport Twice,5550002\r\n").get_json()
+    assert report["inserted"] == 0
+    assert report["skipped"] == 1
+
+
+def test_plain_form_import_redirects(client):
+    data = {"csv_file": (io.BytesIO(b"title\r\nImport Form\r\n"), "movies.csv")}
+    resp = client.post("/import_csv", data=data, content_type="multipart/form-data")
+    assert resp.status_code == 302
+
+
+def test_imported_barcodes_are_found_by_scans(client):
+    upload(client, "title,barcode\r\nImport Dashed,555-0003 1\r\n")
+    assert client.get("/api/barcode/55500031").get_json()["state"] == "owned"
+
+
+def test_init_db_normalizes_stored_barcodes(app_module, client):
+    with closing(app_module.get_db()) as conn:
+        conn.execute("INSERT INTO movies (title, barcode) VALUES ('Import Legacy', '555 0004-1')")
+        conn.commit()
+    app_module.init_db()
+    assert client.get("/api/barcode/55500041").get_json()["state"] == "owned"
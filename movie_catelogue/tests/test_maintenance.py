@@ -0,0 +1,12 @@
+# test_maintenance.py
+from contextlib import closing
+
+
+def test_maintenance_never_reports_negative_reclaim(app_module):
+    with closing(app_module.get_db()) as conn:
+        conn.executemany("INSERT INTO movies (title, notes, format, status) VALUES (?, ?, 'DVD', 'owned')",
+                         [(f"Maintenance {i}", "word " * 200) for i in range(200)])
+        conn.commit()
+    report = app_module.run_maintenance(vacuum=False)
+    assert report["reclaimed_bytes"] >= 0
+    assert report["bytes_after"] == report["pages_after"] * (report["bytes_before"] // report["pages_before"])
@@ -0,0 +1,30 @@
+# test_search_cursor.py
+# Keyset cursors come back from clients, so anything that doesn't fit the sort's keys is a 400.
+from contextlib import closing
+
+import pytest
+
+
+@pytest.mark.parametrize("keys", [
+    [{"a": 1}, 5],
+    ["Title", [1, 2]],
+    ["Title"],
+    ["Title", 5, 6],
+    ["Title", "5"],
+    ["Title", True],
+])
+def test_ill_typed_cursor_is_rejected(app_module, client, keys):
+    token = app_module.encode_cursor("alpha", keys)
+    resp = client.get(f"/api/search?sort=alpha&cursor={token}")
+    assert resp.status_code == 400
+
+
+def test_cursor_pages_follow_on(app_module, client):
+    with closing(app_module.get_db()) as conn:
+        conn.executemany("INSERT INTO movies (title, format, status) VALUES (?, 'DVD', 'owned')",
+                         [("Cursor A",), ("Cursor B",)])
+        conn.commit()
+    first = client.get("/api/search?sort=alpha&cursor=&page_size=1").get_json()
+    second = client.get(f"/api/search?sort=alpha&cursor={first['next_cursor']}&page_size=1")
+    assert second.status_code == 200
+    assert second.get_json()["movies"][0]["rowid"] != first["movies"][0]["rowid"]
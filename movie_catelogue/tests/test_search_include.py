@@ -0,0 +1,15 @@
+# test_search_include.py
+# The grid asks for its six fields plus include=collections and renders a badge from the embedded names.
+from contextlib import closing
+
+
+def test_grid_fields_embed_collections(app_module, client):
+    with closing(app_module.get_db()) as conn:
+        rowid = conn.execute("INSERT INTO movies (title, format, status) VALUES ('Include Test', 'DVD', 'owned')").lastrowid
+        app_module.collection_service.set_movie_collections(conn, rowid, ["Include Saga", "Boxset"])
+        conn.commit()
+    data = client.get("/api/search?q=include&fields=rowid,title,year,format,status,poster_path"
+                      "&include=collections").get_json()
+    movie = next(m for m in data["movies"] if m["rowid"] == rowid)
+    assert sorted(movie["collections"]) == ["Boxset", "Include Saga"]
+    assert set(movie) == {"rowid", "title", "year", "format", "status", "poster_path", "collections"}
@@ -0,0 +1,47 @@
+# test_search_plans.py
+# Query plans for the grid's page query: the default sorts must walk an index and stop after the page
+# rather than sort every match in a temp B-tree.
+from contextlib import closing
+
+import pytest
+
+DEFAULT_SORTS = ("recent", "alpha", "year_desc", "year_asc")
+
+
+def page_plan(app, sort):
+    key_exprs, direction = app.SORT_KEYS[sort]
+    columns = ", ".join("movies.rowid AS rowid" if f == "rowid" else f for f in app.GRID_FIELDS)
+    key_cols = "".join(f", {expr} AS sort_key_{i}" for i, expr in enumerate(key_exprs))
+    order_by = ", ".join(f"{expr} {direction}" for expr in key_exprs)
+    with closing(app.get_db()) as conn:
+        rows = conn.execute(f"""
+            EXPLAIN QUERY PLAN
+            SELECT {columns}{key_cols} FROM movies ORDER BY {order_by} LIMIT ? OFFSET ?
+        """, (app.PAGE_SIZE, 0)).fetchall()
+    return [r[3] for r in rows]
+
+
+@pytest.mark.parametrize("sort", DEFAULT_SORTS)
+def test_default_sort_needs_no_temp_btree(app_module, sort):
+    plan = page_plan(app_module, sort)
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("sort", ("year_desc", "year_asc"))
+def test_year_sorts_use_year_int_index(app_module, sort):
+    plan = page_plan(app_module, sort)
+    assert any("idx_year_int" in step for step in plan), plan
+
+
+def test_search_pages_report_total(app_module, client):
+    with closing(app_module.get_db()) as conn:
+        conn.executemany("INSERT INTO movies (title, year, format, status) VALUES (?, ?, 'DVD', 'owned')",
+                         [(f"Plan Test {i}", str(1990 + i)) for i in range(5)])
+        conn.commit()
+    first = client.get("/api/search?q=plan&page_size=2&sort=year_asc").get_json()
+    last = client.get("/api/search?q=plan&page_size=2&page=3&sort=year_asc").get_json()
+    assert first["total"] == last["total"] == 5
+    assert first["pages"] == 3
+    assert [m["year"] for m in first["movies"]] == ["1990", "1991"]
+    assert len(last["movies"]) == 1
+    assert client.get("/api/search?q=plan&with_total=0").get_json()["total"] is None
@@ -0,0 +1,21 @@
+# test_title_index.py
+# When a local title match is trusted enough to skip the API.
+
+
+def load(app_module, *movies):
+    app_module.title_index.load([dict(zip(("id", "title", "release_date", "popularity"), m)) for m in movies])
+
+
+def test_year_picks_between_dated_remakes(app_module):
+    load(app_module, (910001, "Zqx Psycho", "1960-06-16", 20.0), (910002, "Zqx Psycho", "1998-12-04", 40.0))
+    assert [m["id"] for m in app_module.title_index.search("Zqx Psycho", "1960")][:1] == [910001]
+    # without a year either could be meant
+    assert app_module.title_index.search("Zqx Psycho") == []
+    assert {m["id"] for m in app_module.title_index.search("Zqx Psycho", suggest=True)} == {910001, 910002}
+
+
+def test_rows_without_a_year_are_not_confident(app_module):
+    # daily-export rows carry no year, so they can't confirm the one asked for
+    load(app_module, (910003, "Zqx Undated", None, 5.0))
+    assert app_module.title_index.search("Zqx Undated", "1960") == []
+    assert [m["id"] for m in app_module.title_index.search("Zqx Undated", "1960", suggest=True)] == [910003]
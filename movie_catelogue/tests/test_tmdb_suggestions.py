@@ -0,0 +1,56 @@
+# test_tmdb_suggestions.py
+# Local title index hits and the TMDb API: the identify dialog gets both, background identification runs on
+# the index alone.
+import sqlite3
+
+
+def local_hit(tmdb_id, title):
+    return {"id": tmdb_id, "title": title, "release_date": "1999", "source": "local", "score": 1.0}
+
+
+def fake_api(monkeypatch, app_module, results):
+    calls = []
+
+    def get(path, params, **kwargs):
+        calls.append(params["query"])
+        return {"results": results}
+    monkeypatch.setattr(app_module, "TMDB_API_KEY", "test-key")
+    monkeypatch.setattr(app_module.tmdb_client, "get", get)
+    return calls
+
+
+def test_suggestions_list_local_hits_then_api_results(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.title_index, "search", lambda title, year=None, **kwargs: [local_hit(603, "The Matrix")])
+    calls = fake_api(monkeypatch, app_module, [{"id": 603, "title": "The Matrix"},
+                                               {"id": 604, "title": "The Matrix Reloaded"}])
+    data = client.get("/tmdb_suggestions?title=Suggest+Matrix&year=1999").get_json()
+    assert [m["id"] for m in data] == [603, 604]
+    assert data[0]["source"] == "local"
+    assert calls == ["Suggest Matrix"]
+
+
+def test_identification_uses_a_local_hit_without_the_api(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.title_index, "search", lambda title, year=None, **kwargs: [local_hit(605, "Resolve Me")])
+    calls = fake_api(monkeypatch, app_module, [{"id": 1, "title": "Other"}])
+    assert app_module.resolve_tmdb("Resolve Me", "1999")[3] == 605
+    assert calls == []
+
+
+def test_background_identify_runs_on_the_index_alone(app_module, monkeypatch):
+    started = []
+    monkeypatch.setattr(app_module, "BACKGROUND_IDENTIFY", True)
+    monkeypatch.setattr(app_module.identify_queue, "start", lambda resolve: started.append(resolve) or True)
+    monkeypatch.setattr(app_module.title_index, "available", lambda: False)
+    assert not app_module.background_identify_enabled()
+    assert started == []
+    monkeypatch.setattr(app_module.title_index, "available", lambda: True)
+    assert app_module.background_identify_enabled()
+    assert started == [app_module.resolve_tmdb]
+
+
+def test_a_failed_queue_start_can_be_retried(app_module, monkeypatch):
+    def locked():
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(app_module.identify_queue, "_connect", locked)
+    assert app_module.identify_queue.start(app_module.resolve_tmdb) is False
+    assert app_module.identify_queue._started is False
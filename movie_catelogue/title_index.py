@@ -0,0 +1,280 @@
+# title_index.py
+# Local TMDb title index, so identification can be answered without calling the API. Titles are loaded from
+# TMDb's daily ID export (movie_ids_MM_DD_YYYY.json.gz) or from previously cached search results and stored
+# with normalized forms; lookups try an exact normalized match, then FTS candidates ranked by similarity.
+import difflib
+import gzip
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import closing
+
+import config
+import db
+import metrics
+
+# === CONFIG VARIABLES ===
+INDEX_DB_PATH = getattr(config, 'TITLE_INDEX_DB_PATH', config.DB_PATH)
+ENABLED = getattr(config, 'TITLE_INDEX_ENABLED', True)
+# similarity (0-1, after the year adjustment) a match needs before the API is skipped; it must also be
+# the only such exact title and have a year of its own
+MIN_SCORE = getattr(config, 'TITLE_INDEX_MIN_SCORE', 0.9)
+# weaker matches still listed alongside a confident one
+SUGGEST_SCORE = 0.6
+# FTS rows considered for fuzzy matching
+CANDIDATES = 200
+LOAD_BATCH_SIZE = 5000
+# how long the "index has titles" check is trusted; loads usually happen from the CLI in another process
+AVAILABLE_TTL = 30
+
+ARTICLES = ('the', 'a', 'an')
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+_available = {'value': False, 'checked': 0.0}
+_fts = {'enabled': False}
+
+
+def _connect():
+    if INDEX_DB_PATH == db.DB_PATH:
+        return db.acquire()
+    return db.open_connection(INDEX_DB_PATH)
+
+
+def init_index():
+    with closing(_connect()) as conn:
+        # title is NULL for rows only known by original_title (the daily export has nothing else)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tmdb_titles (
+                tmdb_id INTEGER PRIMARY KEY,
+                title TEXT,
+                original_title TEXT,
+                norm_title TEXT,
+                norm_original TEXT,
+                release_date TEXT,
+                year INTEGER,
+                popularity REAL,
+                poster_path TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tmdb_titles_norm ON tmdb_titles(norm_title)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tmdb_titles_norm_original ON tmdb_titles(norm_original)")
+        try:
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS tmdb_titles_fts USING fts5(
+                    norm_title, norm_original, content='tmdb_titles', content_rowid='tmdb_id'
+                )
+            """)
+            _fts['enabled'] = True
+        except sqlite3.OperationalError as e:
+            print("Title index FTS unavailable, using exact matches only:", e)
+        conn.commit()
+
+
+def normalize(title):
+    # "Amélie", "AMELIE!" and "Amelie" -> "amelie"; "The Thing" / "Thing, The" -> "thing"
+    text = unicodedata.normalize('NFKD', str(title or ''))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = text.replace('&', ' and ')
+    text = re.sub(r"['’]", '', text)
+    words = re.sub(r'[\W_]+', ' ', text).split()
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    if len(words) > 1 and words[-1] in ARTICLES:
+        words = words[:-1]
+    return ' '.join(words)
+
+
+def _year(value):
+    text = str(value or '').strip()[:4]
+    return int(text) if len(text) == 4 and text.isdigit() else None
+
+
+def available():
+    if not ENABLED:
+        return False
+    now = time.monotonic()
+    with _lock:
+        if now - _available['checked'] < AVAILABLE_TTL:
+            return _available['value']
+    try:
+        with closing(_connect()) as conn:
+            value = conn.execute("SELECT 1 FROM tmdb_titles LIMIT 1").fetchone() is not None
+    except sqlite3.Error:
+        value = False
+    with _lock:
+        _available.update(value=value, checked=now)
+    return value
+
+
+def _candidates(conn, norm):
+    columns = "tmdb_id, title, original_title, norm_title, norm_original, release_date, year, popularity, poster_path"
+    rows = conn.execute(
+        f"SELECT {columns} FROM tmdb_titles WHERE norm_title = ? "
+        f"UNION SELECT {columns} FROM tmdb_titles WHERE norm_original = ?",
+        (norm, norm)
+    ).fetchall()
+    if rows or not _fts['enabled']:
+        return rows
+    # no exact match: any shared word makes a candidate, best bm25 first
+    query = " OR ".join(f'"{w}"' for w in norm.split())
+    return conn.execute(f"""
+        SELECT {", ".join("t." + c.strip() for c in columns.split(","))}
+        FROM tmdb_titles_fts f JOIN tmdb_titles t ON t.tmdb_id = f.rowid
+        WHERE tmdb_titles_fts MATCH ? ORDER BY f.rank LIMIT ?
+    """, (query, CANDIDATES)).fetchall()
+
+
+def _score(norm, year, row):
+    score = max(difflib.SequenceMatcher(None, norm, candidate).ratio()
+                for candidate in (row["norm_title"], row["norm_original"]) if candidate)
+    if year and row["year"]:
+        gap = abs(year - row["year"])
+        # off-by-one years are common (festival vs. release date)
+        score -= 0 if gap == 0 else 0.05 if gap == 1 else 0.3
+    return score
+
+
+def _result(row, score, year):
+    # shaped like a TMDb search/movie result so callers can't tell the difference; rows without a year
+    # (everything from the daily export) keep the caller's year rather than blanking it
+    return {
+        "id": row["tmdb_id"],
+        "title": row["title"] or row["original_title"],
+        "original_title": row["original_title"] or row["title"],
+        "release_date": row["release_date"] or str(row["year"] or year or ""),
+        "popularity": row["popularity"],
+        "poster_path": row["poster_path"],
+        "source": "local",
+        "score": round(score, 3),
+    }
+
+
+def _confident(norm, scored):
+    # the best match may skip the API only if it has a year of its own and is the one film it could be:
+    # daily-export rows (no year) score 1.0 for any year asked, and remakes share a title ("Psycho" 1960/1998)
+    if not scored or scored[0][0] < MIN_SCORE or not scored[0][1]["year"]:
+        return False
+    exact = [r for score, r in scored if score >= MIN_SCORE and norm in (r["norm_title"], r["norm_original"])]
+    return len(exact) <= 1
+
+
+def search(title, year=None, limit=20, suggest=False):
+    # TMDb-style results, best first, or [] unless the best is a confident match (the caller then asks the
+    # API); suggest=True lists the near matches anyway, for the identify dialog to choose from
+    norm = normalize(title)
+    if not norm or not available():
+        return []
+    year = _year(year)
+    try:
+        with closing(_connect()) as conn:
+            rows = _candidates(conn, norm)
+    except sqlite3.Error as e:
+        print("Title index error:", e)
+        metrics.inc('app_errors_total', source='title_index')
+        return []
+    scored = sorted(((_score(norm, year, r), r) for r in rows),
+                    key=lambda s: (s[0], s[1]["popularity"] or 0), reverse=True)
+    hit = _confident(norm, scored)
+    with _lock:
+        _stats['hits' if hit else 'misses'] += 1
+    metrics.inc('title_index_lookups_total', result='hit' if hit else 'miss')
+    if not hit and not suggest:
+        return []
+    return [_result(r, score, year) for score, r in scored[:limit] if score >= SUGGEST_SCORE]
+
+
+# --- Loading ---
+def _record(item, include_adult=False):
+    try:
+        tmdb_id = int(item["id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if item.get("adult") and not include_adult:
+        return None
+    title = item.get("title") or None
+    original = item.get("original_title") or None
+    if not title and not original:
+        return None
+    release_date = item.get("release_date") or None
+    return (tmdb_id, title, original, normalize(title) if title else None,
+            normalize(original) if original and original != title else None,
+            release_date, _year(release_date), item.get("popularity"), item.get("poster_path") or None)
+
+
+def read_file(path):
+    # JSON lines (the daily export, or a dump of search results) or a single JSON array; .gz is fine
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first == "[":
+            yield from json.loads(first + f.read())
+            return
+        line = first + f.readline()
+        while line:
+            if line.strip():
+                yield json.loads(line)
+            line = f.readline()
+
+
+def load(items, include_adult=False, progress=None):
+    # upsert TMDb movie dicts; fields missing from a record keep whatever an earlier load stored
+    counts = {"read": 0, "loaded": 0, "skipped": 0}
+    sql = """
+        INSERT INTO tmdb_titles (tmdb_id, title, original_title, norm_title, norm_original, release_date, year,
+                                 popularity, poster_path)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(tmdb_id) DO UPDATE SET
+            title = COALESCE(excluded.title, title),
+            original_title = COALESCE(excluded.original_title, original_title),
+            norm_title = COALESCE(excluded.norm_title, norm_title),
+            norm_original = COALESCE(excluded.norm_original, norm_original),
+            release_date = COALESCE(excluded.release_date, release_date),
+            year = COALESCE(excluded.year, year),
+            popularity = COALESCE(excluded.popularity, popularity),
+            poster_path = COALESCE(excluded.poster_path, poster_path)
+    """
+    with closing(_connect()) as conn:
+        batch = []
+        for item in items:
+            counts["read"] += 1
+            record = _record(item, include_adult) if isinstance(item, dict) else None
+            if record is None:
+                counts["skipped"] += 1
+                continue
+            batch.append(record)
+            if len(batch) >= LOAD_BATCH_SIZE:
+                conn.executemany(sql, batch)
+                conn.commit()
+                counts["loaded"] += len(batch)
+                batch = []
+                if progress:
+                    progress(counts)
+        if batch:
+            conn.executemany(sql, batch)
+            counts["loaded"] += len(batch)
+        # the FTS index is external-content and rebuilt once per load instead of kept in sync by triggers
+        if _fts['enabled']:
+            conn.execute("INSERT INTO tmdb_titles_fts(tmdb_titles_fts) VALUES('rebuild')")
+        conn.commit()
+    with _lock:
+        _available['checked'] = 0.0
+    return counts
+
+
+def stats():
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT COUNT(*), COUNT(year), COUNT(poster_path) FROM tmdb_titles"
+        ).fetchone()
+    with _lock:
+        out = dict(_stats)
+    lookups = out['hits'] + out['misses']
+    out.update({"enabled": ENABLED, "fts": _fts['enabled'], "titles": row[0], "with_year": row[1],
+                "with_poster": row[2], "hit_ratio": round(out['hits'] / lookups, 4) if lookups else 0.0})
+    return out
@@ -0,0 +1,170 @@
+# tmdb_cache.py
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+import config
+import db
+import metrics
+
+# === CONFIG VARIABLES ===
+CACHE_DB_PATH = getattr(config, 'TMDB_CACHE_DB_PATH', config.DB_PATH)
+CACHE_SIZE = getattr(config, 'TMDB_CACHE_SIZE', 1024)
+# seconds each endpoint's responses stay fresh
+CACHE_TTL = {
+    'search': 7 * 24 * 3600,
+    'movie': 30 * 24 * 3600,
+}
+CACHE_TTL.update(getattr(config, 'TMDB_CACHE_TTL', {}))
+# empty search results (a typo, or a transient TMDb miss) are only trusted this long
+NEGATIVE_TTL = getattr(config, 'TMDB_CACHE_NEGATIVE_TTL', 3600)
+
+# sentinel so a cached "no result" (None) can be told apart from a miss
+MISS = object()
+
+_lru = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0}
+
+
+def _connect():
+    if CACHE_DB_PATH == db.DB_PATH:
+        return db.acquire()
+    return db.open_connection(CACHE_DB_PATH)
+
+
+def init_cache():
+    with closing(_connect()) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tmdb_cache (
+                endpoint TEXT NOT NULL,
+                cache_key TEXT NOT NULL,
+                value TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY(endpoint, cache_key)
+            )
+        """)
+        conn.commit()
+
+
+def normalize_year(year):
+    # leading four digits ("1982", 1982, "1982-06-25" -> "1982"), otherwise ''; callers send this same value
+    # to TMDb so the cache key always matches the request
+    y = str(year or '').strip()[:4]
+    return y if len(y) == 4 and y.isdigit() else ''
+
+
+def search_key(query, year=None):
+    # normalize so "The Thing " / "the  thing" and 1982 / "1982" share an entry
+    q = ' '.join(str(query or '').lower().split())
+    return f"{q}|{normalize_year(year)}"
+
+
+def movie_key(tmdb_id):
+    return str(int(tmdb_id))
+
+
+def _ttl(endpoint, value=None):
+    if value == []:
+        return min(NEGATIVE_TTL, CACHE_TTL.get(endpoint, CACHE_TTL['search']))
+    return CACHE_TTL.get(endpoint, CACHE_TTL['search'])
+
+
+def _remember(endpoint, key, value, fetched_at):
+    _lru[(endpoint, key)] = (value, fetched_at)
+    _lru.move_to_end((endpoint, key))
+    while len(_lru) > CACHE_SIZE:
+        _lru.popitem(last=False)
+
+
+def get(endpoint, key):
+    now = time.time()
+    with _lock:
+        entry = _lru.get((endpoint, key))
+        if entry is not None:
+            value, fetched_at = entry
+            if now - fetched_at < _ttl(endpoint, value):
+                _lru.move_to_end((endpoint, key))
+                _stats['hits'] += 1
+                _stats['memory_hits'] += 1
+                return value
+            del _lru[(endpoint, key)]
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute(
+                "SELECT value, fetched_at FROM tmdb_cache WHERE endpoint = ? AND cache_key = ?",
+                (endpoint, key)
+            ).fetchone()
+    except sqlite3.Error as e:
+        print("TMDb cache read error:", e)
+        metrics.inc('app_errors_total', source='tmdb_cache')
+        row = None
+    with _lock:
+        value = json.loads(row[0]) if row else None
+        if row and now - row[1] < _ttl(endpoint, value):
+            _remember(endpoint, key, value, row[1])
+            _stats['hits'] += 1
+            _stats['db_hits'] += 1
+            return value
+        _stats['misses'] += 1
+    return MISS
+
+
+def put(endpoint, key, value):
+    fetched_at = time.time()
+    with _lock:
+        _remember(endpoint, key, value, fetched_at)
+        _stats['stores'] += 1
+    try:
+        with closing(_connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tmdb_cache (endpoint, cache_key, value, fetched_at) VALUES (?, ?, ?, ?)",
+                (endpoint, key, json.dumps(value), fetched_at)
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        print("TMDb cache write error:", e)
+        metrics.inc('app_errors_total', source='tmdb_cache')
+
+
+def search_results():
+    # every movie stored by cached search/movie responses, expired or not (they seed the title index)
+    with closing(_connect()) as conn:
+        rows = conn.execute("SELECT value FROM tmdb_cache WHERE endpoint = 'search'").fetchall()
+    for row in rows:
+        try:
+            results = json.loads(row[0]) or []
+        except ValueError:
+            continue
+        yield from results
+
+
+def purge_expired():
+    now = time.time()
+    removed = 0
+    with closing(_connect()) as conn:
+        for endpoint in CACHE_TTL:
+            c = conn.execute(
+                "DELETE FROM tmdb_cache WHERE endpoint = ? AND fetched_at < ?",
+                (endpoint, now - _ttl(endpoint))
+            )
+            removed += c.rowcount
+        c = conn.execute(
+            "DELETE FROM tmdb_cache WHERE value = '[]' AND fetched_at < ?", (now - NEGATIVE_TTL,)
+        )
+        removed += c.rowcount
+        conn.commit()
+    return removed
+
+
+def stats():
+    with _lock:
+        out = dict(_stats)
+        out['memory_entries'] = len(_lru)
+        out['memory_capacity'] = CACHE_SIZE
+    lookups = out['hits'] + out['misses']
+    out['hit_ratio'] = round(out['hits'] / lookups, 4) if lookups else 0.0
+    return out
@@ -0,0 +1,121 @@
+# tmdb_client.py
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+import metrics
+
+# === CONFIG VARIABLES ===
+# overridable so benchmarks can point the app at a local fake
+BASE_URL = getattr(config, 'TMDB_BASE_URL', "https://api.themoviedb.org/3/")
+# sustained requests per second and burst size shared by every caller in the process; a limit of 0 (or less)
+# disables client-side throttling, leaving only TMDb's own 429s
+RATE_LIMIT = getattr(config, 'TMDB_RATE_LIMIT', 20)
+RATE_BURST = max(1, getattr(config, 'TMDB_RATE_BURST', 20))
+# (connect, read) seconds
+TIMEOUT = getattr(config, 'TMDB_TIMEOUT', (3.05, 10))
+MAX_RETRIES = getattr(config, 'TMDB_MAX_RETRIES', 3)
+POOL_SIZE = getattr(config, 'TMDB_POOL_SIZE', 16)
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE))
+
+_bucket_lock = threading.Lock()
+_tokens = float(RATE_BURST)
+_last_refill = time.monotonic()
+_blocked_until = 0.0
+
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+
+def _acquire():
+    global _tokens, _last_refill
+    while True:
+        with _bucket_lock:
+            now = time.monotonic()
+            _tokens = min(RATE_BURST, _tokens + (now - _last_refill) * RATE_LIMIT)
+            _last_refill = now
+            wait = _blocked_until - now
+            if wait <= 0:
+                if RATE_LIMIT <= 0:
+                    return
+                if _tokens >= 1:
+                    _tokens -= 1
+                    return
+                wait = (1 - _tokens) / RATE_LIMIT
+        time.sleep(wait)
+
+
+def _block_for(seconds):
+    global _blocked_until
+    with _bucket_lock:
+        _blocked_until = max(_blocked_until, time.monotonic() + seconds)
+
+
+def _honour_rate_headers(r):
+    # TMDb may send X-RateLimit-* headers; pause everyone until the window resets
+    remaining = r.headers.get("X-RateLimit-Remaining")
+    reset = r.headers.get("X-RateLimit-Reset")
+    if remaining == "0" and reset:
+        try:
+            _block_for(max(0.0, float(reset) - time.time()))
+        except ValueError:
+            pass
+
+
+def _record(endpoint, elapsed, error=False, throttled=False):
+    metrics.observe('tmdb_request_duration_seconds', elapsed, endpoint=endpoint)
+    metrics.inc('tmdb_requests_total', endpoint=endpoint,
+                outcome='throttled' if throttled else 'error' if error else 'ok')
+    with _metrics_lock:
+        m = _metrics.setdefault(endpoint, {
+            "requests": 0, "errors": 0, "throttled": 0, "total_ms": 0.0, "max_ms": 0.0
+        })
+        m["requests"] += 1
+        m["total_ms"] += elapsed * 1000
+        m["max_ms"] = max(m["max_ms"], elapsed * 1000)
+        if error:
+            m["errors"] += 1
+        if throttled:
+            m["throttled"] += 1
+
+
+def get(path, params=None, endpoint=None):
+    # GET BASE_URL + path and return the decoded JSON; raises on HTTP or network errors
+    endpoint = endpoint or path
+    for attempt in range(MAX_RETRIES + 1):
+        _acquire()
+        started = time.monotonic()
+        try:
+            r = _session.get(BASE_URL + path, params=params, timeout=TIMEOUT)
+        except requests.RequestException:
+            _record(endpoint, time.monotonic() - started, error=True)
+            raise
+        elapsed = time.monotonic() - started
+        if r.status_code == 429 and attempt < MAX_RETRIES:
+            _record(endpoint, elapsed, throttled=True)
+            try:
+                delay = float(r.headers.get("Retry-After", ""))
+            except ValueError:
+                delay = 2 ** attempt
+            _block_for(delay)
+            continue
+        _honour_rate_headers(r)
+        _record(endpoint, elapsed, error=not r.ok, throttled=r.status_code == 429)
+        r.raise_for_status()
+        return r.json()
+
+
+def stats():
+    with _metrics_lock:
+        out = {}
+        for endpoint, m in _metrics.items():
+            out[endpoint] = dict(m)
+            out[endpoint]["avg_ms"] = round(m["total_ms"] / m["requests"], 2) if m["requests"] else 0.0
+            out[endpoint]["total_ms"] = round(m["total_ms"], 2)
+            out[endpoint]["max_ms"] = round(m["max_ms"], 2)
+    return out